@@ -0,0 +1,128 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Protocol
+
+BATCH_SYSTEM_PROMPT = (
+    "You are a code review assistant. The user will send several numbered unified diffs, each for a SMALL CODE "
+    "SNIPPET and each optionally with a note explaining why the snippet is watched. The diffs only include changed "
+    "lines (and sometimes @@ hunk headers). Summarize every diff separately in 1–3 short bullet points, focusing on "
+    "behavior changes, security impact, and configuration changes. Reply with ONLY a JSON array, one object per "
+    'diff, in the form [{"id": 1, "summary": "..."}]. Do not wrap the JSON in markdown code fences.'
+)
+
+# Batched and single diffs get the same instructions and the same note, so a
+# diff is summarized alike whichever path it takes.
+SINGLE_SYSTEM_PROMPT = (
+    "You are a code review assistant. The user will send a unified diff for a SMALL CODE SNIPPET, not the whole "
+    "file, optionally with a note explaining why the snippet is watched. The diff only includes changed lines (and "
+    "sometimes @@ hunk headers). Summarize the change in 1–3 short bullet points, focusing on behavior changes, "
+    "security impact, and configuration changes. Reply in plain text, no markdown code fences."
+)
+
+# Part of every summary cache key. Bump whenever a summary prompt changes so
+# summaries written for the old prompt are not reused.
+PROMPT_VERSION = 2
+
+# Output tokens reserved per diff in a batched reply.
+TOKENS_PER_SUMMARY = 200
+
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.DOTALL)
+
+
+@dataclass(slots=True)
+class DiffRequest:
+    diff_text: str
+    note: str = ""
+
+
+class BatchCapableClient(Protocol):
+    BATCH_TOKEN_BUDGET: int
+    BATCH_MAX_ITEMS: int
+
+    def summarize_diff(self, diff_text: str, note: str = "") -> Optional[str]: ...
+
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> Optional[str]: ...
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for code and English.
+    return len(text) // 4 + 1
+
+
+def _render_item(number: int, request: DiffRequest) -> str:
+    note = request.note.strip() or "—"
+    return f"### Diff {number}\nNote: {note}\n{request.diff_text}\n"
+
+
+def render_single(diff_text: str, note: str = "") -> str:
+    return f"Note: {note.strip() or '—'}\nDiff:\n\n{diff_text}"
+
+
+def pack_batches(requests: List[DiffRequest], token_budget: int, max_items: int) -> List[List[int]]:
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = estimate_tokens(BATCH_SYSTEM_PROMPT)
+    for index, request in enumerate(requests):
+        cost = estimate_tokens(_render_item(index + 1, request)) + TOKENS_PER_SUMMARY
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            used = estimate_tokens(BATCH_SYSTEM_PROMPT)
+        current.append(index)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_prompt(requests: List[DiffRequest], indices: List[int]) -> str:
+    parts = [_render_item(position + 1, requests[index]) for position, index in enumerate(indices)]
+    return "\n".join(parts)
+
+
+def parse_batch_response(text: str, count: int) -> Dict[int, str]:
+    match = _JSON_ARRAY_RE.search(text or "")
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return {}
+
+    summaries: Dict[int, str] = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        number, summary = item.get("id"), item.get("summary")
+        if isinstance(number, int) and 1 <= number <= count and isinstance(summary, str) and summary.strip():
+            summaries[number] = summary.strip()
+    return summaries
+
+
+def summarize_in_batches(client: BatchCapableClient, requests: List[DiffRequest]) -> List[Optional[str]]:
+    results: List[Optional[str]] = [None] * len(requests)
+    pending = [i for i, r in enumerate(requests) if r.diff_text.strip()]
+    subset = [requests[i] for i in pending]
+
+    for batch in pack_batches(subset, client.BATCH_TOKEN_BUDGET, client.BATCH_MAX_ITEMS):
+        originals = [pending[i] for i in batch]
+        if len(batch) == 1:
+            results[originals[0]] = client.summarize_diff(subset[batch[0]].diff_text, subset[batch[0]].note)
+            continue
+
+        raw = client.complete(
+            BATCH_SYSTEM_PROMPT,
+            build_batch_prompt(subset, batch),
+            max_tokens=TOKENS_PER_SUMMARY * len(batch),
+        )
+        parsed = parse_batch_response(raw or "", len(batch))
+        missing = len(batch) - len(parsed)
+        if missing:
+            print(f"Batched summary reply covered {len(parsed)}/{len(batch)} diffs; summarizing the rest one by one")
+        for position, original in enumerate(originals, start=1):
+            summary = parsed.get(position)
+            if summary is None:
+                summary = client.summarize_diff(requests[original].diff_text, requests[original].note)
+            results[original] = summary
+    return results
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from diff_engine import DIFF_ENGINES, build_diff  # noqa: E402
+from run_bench import describe, git_revision  # noqa: E402
+
+_Case = Tuple[str, str]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Compare the diff engines on generated snippet pairs.")
+    parser.add_argument("--lines", type=int, default=3000, help="Lines in the large cases (default: 3000).")
+    parser.add_argument("--edits", type=int, default=12, help="Edited places per case (default: 12).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per engine and case (default: 5).")
+    parser.add_argument("--engines", default=",".join(DIFF_ENGINES), help="Comma-separated engines to run.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    return parser
+
+
+def edit(rng: random.Random, lines: List[str], edits: int) -> List[str]:
+    edited = list(lines)
+    for n in range(edits):
+        at = rng.randrange(len(edited))
+        roll = rng.random()
+        if roll < 0.4:
+            edited[at] = edited[at].rstrip() + f" // edited {n}"
+        elif roll < 0.7:
+            edited.insert(at, f"    require(amount > {n}, \"inserted {n}\");")
+        else:
+            del edited[at : at + rng.randint(1, 4)]
+    return edited
+
+
+def solidity_lines(count: int) -> List[str]:
+    lines: List[str] = []
+    n = 0
+    while len(lines) < count:
+        n += 1
+        lines += [
+            f"    function transfer{n}(address to, uint256 amount) external returns (bool) {{",
+            f"        require(balances[msg.sender] >= amount, \"balance {n}\");",
+            "        balances[msg.sender] -= amount;",
+            "        balances[to] += amount;",
+            "        emit Transfer(msg.sender, to, amount);",
+            "        return true;",
+            "    }",
+            "",
+        ]
+    return lines[:count]
+
+
+def abi_lines(count: int) -> List[str]:
+    # ABI tables repeat the same few lines over and over; only names tell entries apart.
+    lines: List[str] = []
+    n = 0
+    while len(lines) < count:
+        n += 1
+        lines += [
+            "  {",
+            '    "inputs": [',
+            '      { "internalType": "address", "name": "account", "type": "address" },',
+            '      { "internalType": "uint256", "name": "amount", "type": "uint256" }',
+            "    ],",
+            f'    "name": "method{n}",',
+            '    "outputs": [{ "internalType": "bool", "name": "", "type": "bool" }],',
+            '    "stateMutability": "nonpayable",',
+            '    "type": "function"',
+            "  },",
+        ]
+    return lines[:count]
+
+
+def generated_lines(count: int) -> List[str]:
+    return [f"    0x{(n * 2654435761) % 2**32:08x}, 0x{n % 7:02x}, 0x00, 0x00," for n in range(count)]
+
+
+def make_cases(args: argparse.Namespace) -> Dict[str, _Case]:
+    rng = random.Random(args.seed)
+    cases: Dict[str, _Case] = {}
+
+    def add(name: str, lines: List[str], edited: Callable[[List[str]], List[str]]) -> None:
+        cases[name] = ("\n".join(lines), "\n".join(edited(lines)))
+
+    add("small_edit", solidity_lines(60), lambda lines: edit(rng, lines, 3))
+    add("large_edit", solidity_lines(args.lines), lambda lines: edit(rng, lines, args.edits))
+    add("abi_table", abi_lines(args.lines), lambda lines: edit(rng, lines, args.edits))
+    add("generated", generated_lines(args.lines), lambda lines: edit(rng, lines, args.edits))
+    add("reordered", solidity_lines(args.lines), lambda lines: lines[len(lines) // 2 :] + lines[: len(lines) // 2])
+    add("rewrite", solidity_lines(args.lines // 3), lambda lines: abi_lines(len(lines)))
+    return cases
+
+
+def run_case(engine_name: str, case: _Case, repeat: int) -> Dict[str, Any]:
+    engine = DIFF_ENGINES[engine_name]
+    timings: List[float] = []
+    diff = ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        diff = build_diff(case[0], case[1], engine)
+        timings.append(time.perf_counter() - started)
+    lines = diff.splitlines()
+    return {
+        "seconds": describe(timings),
+        "diff_lines": len(lines),
+        "changed_lines": sum(1 for line in lines if not line.startswith("@@")),
+        "hunks": sum(1 for line in lines if line.startswith("@@")),
+        "diff": diff,
+    }
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    engines = [name.strip() for name in args.engines.split(",") if name.strip()]
+    for name in engines:
+        if name not in DIFF_ENGINES:
+            raise SystemExit(f"unknown engine {name}; choose from {', '.join(DIFF_ENGINES)}")
+
+    cases: Dict[str, Any] = {}
+    for case_name, case in make_cases(args).items():
+        results = {name: run_case(name, case, args.repeat) for name in engines}
+        reference = results.get("difflib")
+        for name, result in results.items():
+            # Engines may align ambiguous lines differently; identical means byte-for-byte the difflib output.
+            result["identical_to_difflib"] = None if reference is None else result["diff"] == reference["diff"]
+        for result in results.values():
+            del result["diff"]
+        cases[case_name] = {
+            "old_lines": len(case[0].splitlines()),
+            "new_lines": len(case[1].splitlines()),
+            "engines": results,
+        }
+        print(
+            f"{case_name}: "
+            + ", ".join(f"{name} {result['seconds']['p50'] * 1000:.1f}ms" for name, result in results.items()),
+            file=sys.stderr,
+        )
+
+    output = json.dumps(
+        {
+            "benchmark": "diff",
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "params": vars(args),
+            "cases": cases,
+        },
+        indent=2,
+        sort_keys=True,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+# Latency and error rates are set per group of endpoints.
+SERVICES = ("github", "discord", "telegram", "ai")
+
+_FileKey = Tuple[str, str, str]
+
+_GRAPHQL_REPO_RE = re.compile(r"(r\d+): repository\(owner: \$(o\d+), name: \$(n\d+)\) \{(.*?)\} \} \}(?= r\d+:| \}$)")
+_GRAPHQL_OBJECT_RE = re.compile(r"(f\d+): object\(expression: \$(e\d+)\) \{ \.\.\. on Blob \{ ([^}]*)\}")
+_DIFF_HEADER_RE = re.compile(r"^### Diff (\d+)$", re.MULTILINE)
+
+
+def _pkt(text: str) -> bytes:
+    payload = text.encode("utf-8")
+    return f"{len(payload) + 4:04x}".encode("ascii") + payload
+
+
+class World:
+    # Line `lines` of every file is never inside a snippet, so churn there
+    # changes the file without touching any watched range.
+    def __init__(self, snippets: int, files: int, repos: int, lines: int, snippet_lines: int, seed: int):
+        self.rng = random.Random(seed)
+        self.lines = lines
+        self.files: Dict[_FileKey, List[str]] = {}
+        self.snippets: List[Dict[str, Any]] = []
+        self._version = 0
+        self._lock = threading.Lock()
+
+        repos = max(1, min(repos, files))
+        keys = [("bench", f"repo{i % repos}", f"src/file{i}.sol") for i in range(max(1, files))]
+        for key in keys:
+            self.files[key] = [f"    uint256 value{n} = {n}; // {key[2]}" for n in range(1, lines + 1)]
+
+        per_file: Dict[_FileKey, int] = {}
+        slots = max(1, (lines - 1) // snippet_lines)
+        for i in range(snippets):
+            key = keys[i % len(keys)]
+            slot = per_file.get(key, 0)
+            per_file[key] = slot + 1
+            # Files with more snippets than slots get overlapping ranges.
+            start = (slot % slots) * snippet_lines + 1
+            self.snippets.append(
+                {"owner": key[0], "repo": key[1], "path": key[2], "start": start, "end": start + snippet_lines - 1}
+            )
+        self.heads = {(owner, repo): self._head(owner, repo) for owner, repo, _ in keys}
+
+    def _head(self, owner: str, repo: str) -> str:
+        digest = hashlib.sha1(f"{owner}/{repo}".encode("utf-8"))
+        for key in sorted(k for k in self.files if k[:2] == (owner, repo)):
+            digest.update("\n".join(self.files[key]).encode("utf-8"))
+        return digest.hexdigest()
+
+    def mutate(self, change_rate: float, churn_rate: float) -> Dict[str, int]:
+        with self._lock:
+            self._version += 1
+            touched = set()
+            changed = 0
+            for snippet in self.snippets:
+                if self.rng.random() < change_rate:
+                    key = (snippet["owner"], snippet["repo"], snippet["path"])
+                    line = self.rng.randint(snippet["start"], snippet["end"])
+                    self.files[key][line - 1] = f"    uint256 value{line} = {self._version}; // edited"
+                    touched.add(key)
+                    changed += 1
+            churned = 0
+            for key, lines in self.files.items():
+                if self.rng.random() < churn_rate:
+                    lines[self.lines - 1] = f"    // churn {self._version}"
+                    touched.add(key)
+                    churned += 1
+            for owner, repo in {key[:2] for key in touched}:
+                self.heads[(owner, repo)] = self._head(owner, repo)
+            return {"changed_snippets": changed, "churned_files": churned}
+
+    def read(self, owner: str, repo: str, path: str) -> Optional[bytes]:
+        with self._lock:
+            lines = self.files.get((owner, repo, path))
+            return ("\n".join(lines) + "\n").encode("utf-8") if lines is not None else None
+
+    def head(self, owner: str, repo: str) -> Optional[str]:
+        with self._lock:
+            return self.heads.get((owner, repo))
+
+
+class MockServices:
+    def __init__(self, world: World, latency: Dict[str, float], errors: Dict[str, float], seed: int = 0):
+        self.world = world
+        self.latency = latency
+        self.errors = errors
+        self.rng = random.Random(seed + 1)
+        self.stats: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def snapshot(self, reset: bool = False) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.stats)
+            if reset:
+                self.stats.clear()
+        return stats
+
+    def should_fail(self, service: str) -> bool:
+        with self._lock:
+            return self.rng.random() < self.errors.get(service, 0.0)
+
+
+def _summary_reply(prompt: str) -> str:
+    # Batched prompts number their diffs and expect a JSON array back.
+    numbers = _DIFF_HEADER_RE.findall(prompt)
+    if numbers:
+        return json.dumps([{"id": int(n), "summary": f"- Stand-in summary for diff {n}"} for n in numbers])
+    return "- Stand-in summary"
+
+
+def make_handler(services: MockServices):
+    world = services.world
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real services, so connection pooling is measured too.
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def _reply(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def _json(self, status: int, data: Any) -> None:
+            self._reply(status, json.dumps(data).encode("utf-8"), {"Content-Type": "application/json"})
+
+        def _body(self) -> bytes:
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _enter(self, service: str, name: str) -> bool:
+            services.count(name)
+            delay = services.latency.get(service, 0.0)
+            if delay:
+                time.sleep(delay)
+            if services.should_fail(service):
+                services.count("errors")
+                self._reply(503, b"stand-in failure")
+                return False
+            return True
+
+        def do_GET(self) -> None:
+            path = urlparse(self.path).path
+            if path == "/_bench/snippets":
+                self._json(200, world.snippets)
+            elif path == "/_bench/stats":
+                self._json(200, services.snapshot())
+            elif path.startswith("/raw/"):
+                self._raw(path)
+            elif path.startswith("/git/") and path.endswith("/info/refs"):
+                self._refs_v0(path)
+            else:
+                self._reply(404)
+
+        def do_POST(self) -> None:
+            path = urlparse(self.path).path
+            body = self._body()
+            if path == "/_bench/mutate":
+                params = json.loads(body or b"{}")
+                self._json(200, world.mutate(params.get("change_rate", 0.0), params.get("churn_rate", 0.0)))
+            elif path == "/_bench/reset":
+                self._json(200, services.snapshot(reset=True))
+            elif path.startswith("/git/") and path.endswith("/git-upload-pack"):
+                self._ls_refs(path)
+            elif path == "/graphql":
+                self._graphql(json.loads(body))
+            elif path.startswith("/discord/"):
+                if self._enter("discord", "discord"):
+                    self._reply(204)
+            elif path.startswith("/telegram/"):
+                if self._enter("telegram", "telegram"):
+                    self._json(200, {"ok": True, "result": {}})
+            elif path.startswith("/openai/"):
+                self._openai(json.loads(body))
+            elif path.startswith("/gemini/"):
+                self._gemini(json.loads(body))
+            elif path.startswith("/ollama/"):
+                self._ollama(json.loads(body))
+            else:
+                self._reply(404)
+
+        def _raw(self, path: str) -> None:
+            if not self._enter("github", "raw"):
+                return
+            parts = unquote(path).split("/", 5)
+            if len(parts) < 6:
+                self._reply(404)
+                return
+            _, _, owner, repo, _ref, file_path = parts
+            # Every ref serves the current content; the benchmark never asks for history.
+            data = world.read(owner, repo, file_path)
+            if data is None:
+                self._reply(404)
+                return
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                services.count("raw_not_modified")
+                self._reply(304, headers={"ETag": etag})
+                return
+            self._reply(200, data, {"ETag": etag, "Content-Type": "text/plain; charset=utf-8"})
+
+        def _repo_of(self, path: str) -> Tuple[str, str]:
+            owner, repo = path[len("/git/") :].split("/")[:2]
+            return owner, repo[: -len(".git")] if repo.endswith(".git") else repo
+
+        def _ls_refs(self, path: str) -> None:
+            if not self._enter("github", "ls_refs"):
+                return
+            head = world.head(*self._repo_of(path))
+            body = (_pkt(f"{head} refs/heads/main\n") if head else b"") + b"0000"
+            self._reply(200, body, {"Content-Type": "application/x-git-upload-pack-result"})
+
+        def _refs_v0(self, path: str) -> None:
+            if not self._enter("github", "info_refs"):
+                return
+            head = world.head(*self._repo_of(path[: -len("/info/refs")]))
+            body = _pkt("# service=git-upload-pack\n") + b"0000"
+            if head:
+                body += _pkt(f"{head} refs/heads/main\0side-band-64k\n")
+            body += b"0000"
+            self._reply(200, body, {"Content-Type": "application/x-git-upload-pack-advertisement"})
+
+        def _graphql(self, request: Dict[str, Any]) -> None:
+            if not self._enter("github", "graphql"):
+                return
+            query, variables = request.get("query", ""), request.get("variables") or {}
+            data: Dict[str, Any] = {}
+            for repo_alias, owner_var, name_var, inner in _GRAPHQL_REPO_RE.findall(query):
+                repo: Dict[str, Any] = {}
+                for file_alias, expr_var, fields in _GRAPHQL_OBJECT_RE.findall(inner + " }"):
+                    _ref, _, file_path = variables[expr_var].partition(":")
+                    content = world.read(variables[owner_var], variables[name_var], file_path)
+                    if content is None:
+                        repo[file_alias] = None
+                        continue
+                    blob = {
+                        "oid": hashlib.sha1(content).hexdigest(),
+                        "byteSize": len(content),
+                        "isBinary": False,
+                        "isTruncated": False,
+                        "text": content.decode("utf-8"),
+                    }
+                    repo[file_alias] = {name: blob[name] for name in fields.split() if name in blob}
+                data[repo_alias] = repo
+            self._json(200, {"data": data})
+
+        def _openai(self, request: Dict[str, Any]) -> None:
+            if not self._enter("ai", "openai"):
+                return
+            text = _summary_reply(request["messages"][-1]["content"])
+            self._json(200, {"choices": [{"message": {"role": "assistant", "content": text}}]})
+
+        def _gemini(self, request: Dict[str, Any]) -> None:
+            if not self._enter("ai", "gemini"):
+                return
+            prompt = "".join(part.get("text", "") for part in request["contents"][0]["parts"])
+            text = _summary_reply(prompt)
+            self._json(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+        def _ollama(self, request: Dict[str, Any]) -> None:
+            if not self._enter("ai", "ollama"):
+                return
+            text = _summary_reply(request["messages"][-1]["content"])
+            self._json(200, {"message": {"role": "assistant", "content": text}})
+
+    return Handler
+
+
+def parse_service_values(items: List[str], scale: float = 1.0) -> Dict[str, float]:
+    values: Dict[str, float] = {}
+    for item in items or []:
+        name, _, raw = item.partition("=")
+        targets = SERVICES if name == "all" else (name,)
+        for target in targets:
+            if target not in SERVICES:
+                raise ValueError(f"Unknown service {target!r}; expected one of {', '.join(SERVICES)} or all")
+            values[target] = float(raw) * scale
+    return values
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local stand-ins for GitHub, Discord, Telegram and the AI APIs.")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on (default: any free port).")
+    parser.add_argument("--snippets", type=int, default=100)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--repos", type=int, default=5)
+    parser.add_argument("--lines", type=int, default=400, help="Lines per generated file.")
+    parser.add_argument("--snippet-lines", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--latency",
+        action="append",
+        default=[],
+        metavar="SERVICE=MS",
+        help=f"Added latency per request; SERVICE is one of {', '.join(SERVICES)} or all. Repeatable.",
+    )
+    parser.add_argument(
+        "--errors",
+        action="append",
+        default=[],
+        metavar="SERVICE=RATE",
+        help="Share of requests answered with 503, e.g. github=0.02. Repeatable.",
+    )
+    return parser
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    world = World(args.snippets, args.files, args.repos, args.lines, args.snippet_lines, args.seed)
+    services = MockServices(
+        world,
+        latency=parse_service_values(args.latency, scale=0.001),
+        errors=parse_service_values(args.errors),
+        seed=args.seed,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(services))
+    server.daemon_threads = True
+    # The harness reads the base URL from the first line of output.
+    print(f"http://127.0.0.1:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from config_manager import ConfigManager  # noqa: E402
+from discord import DiscordNotifier  # noqa: E402
+from github_client import GitHubClient  # noqa: E402
+from github_graphql import GraphQLClient  # noqa: E402
+from http_cache import ResponseCache  # noqa: E402
+from metrics import STAGE_SECONDS, SUMMARY_SECONDS  # noqa: E402
+from models import AppConfig, SnippetConfig  # noqa: E402
+from monitor import SnippetMonitor  # noqa: E402
+from outbox import Outbox  # noqa: E402
+from router import NotificationRouter  # noqa: E402
+from telegram import TelegramNotifier  # noqa: E402
+from transport import HttpTransport  # noqa: E402
+from utils import snippet_id_from_parsed  # noqa: E402
+
+_Series = Dict[Tuple[str, ...], Tuple[List[int], float, int]]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Measure SnippetMonitor.run_once end to end against local stand-ins for every remote service."
+    )
+    parser.add_argument("--snippets", type=int, default=200, help="Snippets to watch (default: 200).")
+    parser.add_argument("--files", type=int, default=50, help="Files the snippets are spread over (default: 50).")
+    parser.add_argument("--repos", type=int, default=10, help="Repositories the files are spread over (default: 10).")
+    parser.add_argument("--lines", type=int, default=400, help="Lines per generated file (default: 400).")
+    parser.add_argument("--cycles", type=int, default=5, help="Measured cycles after the baseline cycle (default: 5).")
+    parser.add_argument(
+        "--change-rate", type=float, default=0.05, help="Chance per cycle that a snippet's lines change (default: 0.05)."
+    )
+    parser.add_argument(
+        "--churn-rate",
+        type=float,
+        default=0.2,
+        help="Chance per cycle that a file changes outside every snippet (default: 0.2).",
+    )
+    parser.add_argument("--backend", choices=["http", "graphql"], default="http", help="File fetch backend.")
+    parser.add_argument("--ai", choices=["none", "openai", "gemini", "ollama"], default="none")
+    parser.add_argument("--channels", default="discord", help="Comma-separated channels: discord,telegram.")
+    parser.add_argument("--digest", action="store_true", help="Run the monitor in digest mode.")
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--fetch-per-host", type=int, default=4)
+    parser.add_argument(
+        "--latency",
+        action="append",
+        default=[],
+        metavar="SERVICE=MS",
+        help="Stand-in latency per request; SERVICE is github, discord, telegram, ai or all. Repeatable.",
+    )
+    parser.add_argument(
+        "--errors",
+        action="append",
+        default=[],
+        metavar="SERVICE=RATE",
+        help="Share of stand-in responses that are 503s, e.g. github=0.02. Repeatable.",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="Seconds to wait for queued notifications.")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    parser.add_argument("--trace", metavar="DIR", help="Also write a span trace of every cycle to DIR.")
+    parser.add_argument("--trace-format", choices=["jsonl", "chrome"], default="jsonl")
+    parser.add_argument("--profile", metavar="DIR", help="Also write folded-stack profiles of every cycle to DIR.")
+    parser.add_argument("--verbose", action="store_true", help="Show the monitor's own output.")
+    return parser
+
+
+def start_services(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    # The stand-ins run in their own process so they do not share the GIL or
+    # the peak RSS with the code being measured.
+    cmd = [
+        sys.executable,
+        os.path.join(BENCH_DIR, "mock_services.py"),
+        "--snippets",
+        str(args.snippets),
+        "--files",
+        str(args.files),
+        "--repos",
+        str(args.repos),
+        "--lines",
+        str(args.lines),
+        "--seed",
+        str(args.seed),
+    ]
+    for item in args.latency:
+        cmd += ["--latency", item]
+    for item in args.errors:
+        cmd += ["--errors", item]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    base_url = proc.stdout.readline().strip()
+    if not base_url:
+        proc.kill()
+        raise RuntimeError("Stand-in services did not start")
+    return proc, base_url
+
+
+def write_config(workdir: str, base_url: str, args: argparse.Namespace) -> ConfigManager:
+    config = AppConfig(
+        webhook_url=f"{base_url}/discord/webhook",
+        telegram_bot_token="bench-token",
+        telegram_chat_id="1",
+        telegram_api_base=f"{base_url}/telegram",
+        openai_key="bench-key",
+        openai_model="bench-model",
+        openai_endpoint=f"{base_url}/openai/v1",
+        gemini_api_key="bench-key",
+        gemini_model="bench-model",
+        gemini_endpoint=f"{base_url}/gemini/v1beta",
+        ollama_endpoint=f"{base_url}/ollama",
+        ollama_model="bench-model",
+        cache_dir=os.path.join(workdir, "cache"),
+        fetch_backend=args.backend,
+        raw_base_url=f"{base_url}/raw",
+        git_base_url=f"{base_url}/git",
+        graphql_url=f"{base_url}/graphql",
+        fetch_workers=args.fetch_workers,
+        fetch_per_host=args.fetch_per_host,
+        snippets=[],
+    )
+
+    client = GitHubClient()
+    for item in requests.get(f"{base_url}/_bench/snippets", timeout=30).json():
+        url = (
+            f"https://github.com/{item['owner']}/{item['repo']}/blob/main/{item['path']}"
+            f"#L{item['start']}-L{item['end']}"
+        )
+        parsed = client.parse_github_url(url)
+        config.snippets.append(
+            SnippetConfig(
+                id=snippet_id_from_parsed(parsed),
+                owner=parsed.owner,
+                repo=parsed.repo,
+                branch=parsed.branch,
+                file_path=parsed.file_path,
+                start_line=parsed.start_line,
+                end_line=parsed.end_line,
+                file_url=url,
+            )
+        )
+
+    config_manager = ConfigManager(os.path.join(workdir, "config.json"))
+    config_manager.save(config)
+    return config_manager
+
+
+def build_monitor(
+    config_manager: ConfigManager,
+    args: argparse.Namespace,
+) -> Tuple[SnippetMonitor, NotificationRouter, Outbox, HttpTransport]:
+    config = config_manager.load()
+    transport = HttpTransport(
+        pool_size=config.http_pool_size,
+        retries=config.http_retries,
+        timeout=config.http_timeout,
+    )
+    cache = ResponseCache(os.path.join(config.cache_dir, "http"))
+    if config.fetch_backend == "graphql":
+        github_client: GitHubClient = GraphQLClient(
+            cache=cache,
+            transport=transport,
+            git_base_url=config.git_base_url,
+            graphql_url=config.graphql_url,
+            raw_base_url=config.raw_base_url,
+        )
+    else:
+        github_client = GitHubClient(
+            cache=cache,
+            transport=transport,
+            git_base_url=config.git_base_url,
+            raw_base_url=config.raw_base_url,
+        )
+
+    outbox = Outbox(os.path.join(os.path.dirname(config_manager.path), "outbox.db"))
+    channels: Dict[str, Any] = {}
+    for name in [c.strip() for c in args.channels.split(",") if c.strip()]:
+        if name == "discord":
+            channels[name] = DiscordNotifier(config.webhook_url, transport=transport, outbox=outbox)
+        elif name == "telegram":
+            channels[name] = TelegramNotifier(
+                config.telegram_bot_token,
+                config.telegram_chat_id,
+                transport=transport,
+                outbox=outbox,
+                api_base=config.telegram_api_base,
+            )
+        else:
+            raise ValueError(f"Unknown channel {name!r}")
+    router = NotificationRouter(channels, timeout=config.notify_timeout_seconds)
+
+    monitor = SnippetMonitor(
+        config_manager=config_manager,
+        github_client=github_client,
+        notifier=router,
+        provider=None if args.ai == "none" else args.ai,
+        model="bench-model",
+        transport=transport,
+        digest=args.digest,
+        trace_dir=args.trace,
+        trace_format=args.trace_format,
+        profile_dir=args.profile,
+    )
+    return monitor, router, outbox, transport
+
+
+def percentile(values: Sequence[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def describe(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    return {
+        "mean": sum(values) / len(values) if values else None,
+        "min": min(values) if values else None,
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": max(values) if values else None,
+    }
+
+
+def histogram_quantile(buckets: Sequence[float], counts: Sequence[int], fraction: float) -> Optional[float]:
+    total = sum(counts)
+    if not total:
+        return None
+    rank = total * fraction
+    seen = 0
+    lower = 0.0
+    for bound, count in zip((*buckets, float("inf")), counts):
+        if count and seen + count >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return lower
+
+
+def series_delta(before: _Series, after: _Series, buckets: Sequence[float]) -> Dict[str, Dict[str, Any]]:
+    stages: Dict[str, Dict[str, Any]] = {}
+    for key, (counts, total, count) in sorted(after.items()):
+        old_counts, old_total, old_count = before.get(key, ([0] * len(counts), 0.0, 0))
+        delta = [new - old for new, old in zip(counts, old_counts)]
+        calls = count - old_count
+        if not calls:
+            continue
+        stages[key[0]] = {
+            "count": calls,
+            "mean_seconds": (total - old_total) / calls,
+            "p50_seconds": histogram_quantile(buckets, delta, 0.5),
+            "p95_seconds": histogram_quantile(buckets, delta, 0.95),
+        }
+    return stages
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "-C", os.path.dirname(BENCH_DIR), "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def request_stats(base_url: str) -> Dict[str, int]:
+    return requests.get(f"{base_url}/_bench/stats", timeout=30).json()
+
+
+def stats_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {name: count - before.get(name, 0) for name, count in after.items() if count != before.get(name, 0)}
+
+
+def run_cycle(monitor: SnippetMonitor, base_url: str, verbose: bool) -> Dict[str, Any]:
+    # The mock's counters only ever grow; each cycle reports what it added, so
+    # totals across cycles and the delivery count below stay consistent.
+    before = request_stats(base_url)
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    with sink:
+        report = monitor.run_once()
+    seconds = time.perf_counter() - started
+    stats = stats_delta(before, request_stats(base_url))
+    return {
+        "seconds": seconds,
+        "changed": len(report.changed),
+        "failed": len(report.failed),
+        "deferred": len(report.deferred),
+        "requests": stats,
+    }
+
+
+def wait_for_outbox(outbox: Outbox, channels: Sequence[str], timeout: float) -> int:
+    deadline = time.monotonic() + timeout
+    while True:
+        pending = sum(outbox.pending(name) for name in channels)
+        if not pending or time.monotonic() >= deadline:
+            return pending
+        time.sleep(0.1)
+
+
+def main() -> None:
+    args = build_arg_parser().parse_args()
+    workdir = tempfile.mkdtemp(prefix="echelon-bench-")
+    proc, base_url = start_services(args)
+    try:
+        config_manager = write_config(workdir, base_url, args)
+        monitor, router, outbox, transport = build_monitor(config_manager, args)
+
+        baseline = run_cycle(monitor, base_url, args.verbose)
+        stages_before = STAGE_SECONDS.series()
+        summaries_before = SUMMARY_SECONDS.series()
+        delivered_before = request_stats(base_url)
+
+        cycles: List[Dict[str, Any]] = []
+        for number in range(1, args.cycles + 1):
+            mutation = requests.post(
+                f"{base_url}/_bench/mutate",
+                json={"change_rate": args.change_rate, "churn_rate": args.churn_rate},
+                timeout=30,
+            ).json()
+            cycle = run_cycle(monitor, base_url, args.verbose)
+            cycle.update(number=number, **mutation)
+            cycles.append(cycle)
+            print(
+                f"cycle {number}: {cycle['seconds']:.3f}s, {cycle['changed']}/{mutation['changed_snippets']} changes, "
+                f"{sum(cycle['requests'].values())} requests",
+                file=sys.stderr,
+            )
+
+        undelivered = wait_for_outbox(outbox, list(router.channels), args.drain_timeout)
+        totals: Dict[str, float] = {}
+        for cycle in cycles:
+            for name, count in cycle["requests"].items():
+                totals[name] = totals.get(name, 0) + count
+        delivered = request_stats(base_url)
+
+        results = {
+            "benchmark": "run_once",
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "params": vars(args),
+            "baseline_cycle": baseline,
+            "cycles": cycles,
+            "summary": {
+                "cycle_seconds": describe([c["seconds"] for c in cycles]),
+                "requests_per_cycle": {name: count / max(1, len(cycles)) for name, count in sorted(totals.items())},
+                "changes_expected": sum(c["changed_snippets"] for c in cycles),
+                "changes_detected": sum(c["changed"] for c in cycles),
+                "failed": sum(c["failed"] for c in cycles),
+                "deferred": sum(c["deferred"] for c in cycles),
+                # Deliveries run in the background, so they are counted once the outbox drained.
+                "notifications_sent": {
+                    name: delivered.get(name, 0) - delivered_before.get(name, 0) for name in router.channels
+                },
+                "notifications_undelivered": undelivered,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "stages": series_delta(stages_before, STAGE_SECONDS.series(), STAGE_SECONDS.buckets),
+                "summaries": series_delta(summaries_before, SUMMARY_SECONDS.series(), SUMMARY_SECONDS.buckets),
+            },
+        }
+
+        router.close()
+        outbox.close()
+        transport.close()
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,119 @@
 import json
 import os
-from typing import Optional
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Tuple
 
-from models import AppConfig
+from models import AppConfig, SNIPPET_STATE_FIELDS, SnippetConfig
+from state_store import StateStore
+
+# Fields written into config.json by releases that predate state.db.
+LEGACY_STATE_FIELDS = ("original_code", "last_seen_code")
 
 
 class ConfigManager:
-    def __init__(self, path: str = "config.json"):
+    def __init__(self, path: str = "config.json", state_path: Optional[str] = None):
         self.path = path
+        self.state_path = state_path or os.path.join(os.path.dirname(os.path.abspath(path)), "state.db")
+        self._state: Optional[StateStore] = None
+        self._cached: Optional[AppConfig] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+
+    @property
+    def state(self) -> StateStore:
+        if self._state is None:
+            self._state = StateStore(self.state_path)
+        return self._state
 
     def load(self) -> AppConfig:
-        if not os.path.exists(self.path):
+        signature = self._stat_signature()
+        if signature is None:
+            self._cached = None
+            self._signature = None
             return AppConfig(snippets=[])
-        with open(self.path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return AppConfig.from_dict(data)
+        if self._cached is not None and signature == self._signature:
+            return self._cached
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError as e:
+            if self._cached is None:
+                raise
+            print(f"Could not reload {self.path}, keeping previous configuration: {e}")
+            return self._cached
+
+        config = AppConfig.from_dict(data)
+        if self._has_inline_state(data):
+            self._migrate_inline_state(config, data)
+            return config
+
+        if self._cached is None:
+            self.state.load_into(config.snippets)
+        else:
+            self._merge_watchlist(config)
+        self._cached = config
+        self._signature = signature
+        return config
 
     def save(self, config: AppConfig) -> None:
-        with open(self.path, "w", encoding="utf-8") as f:
+        self._write_settings(config)
+        self.state.save_snippets(config.snippets or [])
+
+    def save_snippet_state(self, snippet: SnippetConfig) -> None:
+        self.state.save_snippet(snippet)
+
+    def _write_settings(self, config: AppConfig) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(config.to_dict(), f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._cached = config
+        self._signature = self._stat_signature()
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _merge_watchlist(self, config: AppConfig) -> None:
+        # Keep the in-memory SnippetConfig objects (and their state) for
+        # snippets that survived the edit; only new ids hit the state store.
+        current = {s.id: s for s in self._cached.snippets or []}
+        definition_fields = [f.name for f in fields(SnippetConfig) if f.name not in SNIPPET_STATE_FIELDS]
+
+        merged: List[SnippetConfig] = []
+        added: List[SnippetConfig] = []
+        for snippet in config.snippets or []:
+            existing = current.pop(snippet.id, None)
+            if existing is None:
+                added.append(snippet)
+                merged.append(snippet)
+                continue
+            for name in definition_fields:
+                setattr(existing, name, getattr(snippet, name))
+            merged.append(existing)
+
+        if added:
+            self.state.load_into(added)
+        if added or current:
+            print(f"Reloaded {self.path}: {len(added)} snippet(s) added, {len(current)} removed")
+        config.snippets = merged
+
+    def _has_inline_state(self, data: Dict[str, Any]) -> bool:
+        inline_fields = SNIPPET_STATE_FIELDS + LEGACY_STATE_FIELDS
+        return any(field in s for s in data.get("snippets", []) for field in inline_fields)
+
+    def _migrate_inline_state(self, config: AppConfig, data: Dict[str, Any]) -> None:
+        for snippet, raw in zip(config.snippets, data.get("snippets", [])):
+            if raw.get("original_code"):
+                snippet.original_digest = self.state.put_blob(raw["original_code"])
+            if raw.get("last_seen_code"):
+                snippet.last_seen_digest = self.state.put_blob(raw["last_seen_code"])
+        # Rows already in the store are newer than what an old config.json
+        # carried, so they win; everything else is taken from config.json.
+        self.state.load_into(config.snippets)
+        self.state.save_snippets(config.snippets)
+        self._write_settings(config)
+        print(f"Migrated snippet state from {self.path} to {self.state_path}")
@@ -0,0 +1,313 @@
+import bisect
+import difflib
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+
+# Below this many lines on both sides difflib is fast and does not yet apply its
+# "popular line" junk heuristic, so "auto" keeps today's exact hunks there.
+DIFFLIB_MAX_LINES = 200
+
+# Unchanged lines shown around each change before hunks are merged, as in unified_diff.
+CONTEXT_LINES = 3
+
+_Block = Tuple[int, int, int]
+_Opcode = Tuple[str, int, int, int, int]
+
+
+class DiffEngine(Protocol):
+    name: str
+
+    def matching_blocks(self, a: Sequence[int], b: Sequence[int]) -> List[_Block]:
+        ...
+
+
+class DifflibEngine:
+    name = "difflib"
+
+    def matching_blocks(self, a: Sequence[int], b: Sequence[int]) -> List[_Block]:
+        return [tuple(block) for block in difflib.SequenceMatcher(None, a, b).get_matching_blocks()[:-1]]
+
+
+class MyersEngine:
+    # Myers' O(ND) algorithm with the linear-space middle-snake split. Cost grows
+    # with the size of the edit, not with how repetitive the lines are.
+    name = "myers"
+
+    def matching_blocks(self, a: Sequence[int], b: Sequence[int]) -> List[_Block]:
+        # Lines that never occur on the other side cannot be part of any match;
+        # dropping them first keeps rewrites and pure insertions cheap.
+        in_b = set(b)
+        in_a = set(a)
+        a_index = [i for i, line in enumerate(a) if line in in_b]
+        b_index = [j for j, line in enumerate(b) if line in in_a]
+        a_kept = [a[i] for i in a_index]
+        b_kept = [b[j] for j in b_index]
+
+        pairs: List[Tuple[int, int]] = []
+        _diff_range(a_kept, b_kept, 0, len(a_kept), 0, len(b_kept), pairs)
+        return _blocks([(a_index[x], b_index[y]) for x, y in pairs])
+
+
+class PatienceEngine:
+    # Lines that occur exactly once on each side anchor the diff; the longest run
+    # of anchors in the same order is kept and the gaps between them are diffed
+    # on their own. Moved blocks cost O(N log N) here instead of O(ND) for Myers.
+    name = "patience"
+
+    def __init__(self) -> None:
+        self._fallback = MyersEngine()
+
+    def matching_blocks(self, a: Sequence[int], b: Sequence[int]) -> List[_Block]:
+        pairs: List[Tuple[int, int]] = []
+        self._diff_range(a, b, 0, len(a), 0, len(b), pairs)
+        return _blocks(pairs)
+
+    def _diff_range(
+        self, a: Sequence[int], b: Sequence[int], a_lo: int, a_hi: int, b_lo: int, b_hi: int, pairs: List[Tuple[int, int]]
+    ) -> None:
+        a_lo, a_hi, b_lo, b_hi, suffix = _trim_common(a, b, a_lo, a_hi, b_lo, b_hi, pairs)
+
+        if a_lo < a_hi and b_lo < b_hi:
+            anchors = _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+            if anchors:
+                i, j = a_lo, b_lo
+                for x, y in anchors:
+                    if x > i or y > j:
+                        self._diff_range(a, b, i, x, j, y, pairs)
+                    pairs.append((x, y))
+                    i, j = x + 1, y + 1
+                self._diff_range(a, b, i, a_hi, j, b_hi, pairs)
+            else:
+                for x, y, size in self._fallback.matching_blocks(a[a_lo:a_hi], b[b_lo:b_hi]):
+                    pairs.extend((a_lo + x + k, b_lo + y + k) for k in range(size))
+
+        pairs.extend((a_hi + k, b_hi + k) for k in range(suffix))
+
+
+class AutoEngine:
+    name = "auto"
+
+    def __init__(self, max_difflib_lines: int = DIFFLIB_MAX_LINES):
+        self.max_difflib_lines = max_difflib_lines
+        self._small = DifflibEngine()
+        self._large = PatienceEngine()
+
+    def matching_blocks(self, a: Sequence[int], b: Sequence[int]) -> List[_Block]:
+        if max(len(a), len(b)) < self.max_difflib_lines:
+            return self._small.matching_blocks(a, b)
+        return self._large.matching_blocks(a, b)
+
+
+DIFF_ENGINES: Dict[str, DiffEngine] = {
+    "auto": AutoEngine(),
+    "difflib": DifflibEngine(),
+    "myers": MyersEngine(),
+    "patience": PatienceEngine(),
+}
+
+
+def _blocks(pairs: List[Tuple[int, int]]) -> List[_Block]:
+    blocks: List[_Block] = []
+    for i, j in pairs:
+        if blocks:
+            bi, bj, size = blocks[-1]
+            if bi + size == i and bj + size == j:
+                blocks[-1] = (bi, bj, size + 1)
+                continue
+        blocks.append((i, j, 1))
+    return blocks
+
+
+def _unique_anchors(
+    a: Sequence[int], b: Sequence[int], a_lo: int, a_hi: int, b_lo: int, b_hi: int
+) -> List[Tuple[int, int]]:
+    # None marks a line seen more than once on that side.
+    in_a: Dict[int, Optional[int]] = {}
+    for i in range(a_lo, a_hi):
+        in_a[a[i]] = None if a[i] in in_a else i
+    in_b: Dict[int, Optional[int]] = {}
+    for j in range(b_lo, b_hi):
+        in_b[b[j]] = None if b[j] in in_b else j
+    candidates = sorted(
+        (i, in_b[line]) for line, i in in_a.items() if i is not None and in_b.get(line) is not None
+    )
+    if not candidates:
+        return []
+
+    # Longest increasing run of b positions (patience sorting).
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous: List[int] = []
+    for index, (_, j) in enumerate(candidates):
+        slot = bisect.bisect_left(tails, j)
+        previous.append(tail_index[slot - 1] if slot else -1)
+        if slot == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[slot] = j
+            tail_index[slot] = index
+    anchors: List[Tuple[int, int]] = []
+    index = tail_index[-1]
+    while index >= 0:
+        anchors.append(candidates[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _trim_common(
+    a: Sequence[int], b: Sequence[int], a_lo: int, a_hi: int, b_lo: int, b_hi: int, pairs: List[Tuple[int, int]]
+) -> Tuple[int, int, int, int, int]:
+    # Matches the common prefix into pairs right away; the common suffix is only
+    # counted, since its pairs must follow whatever the middle adds.
+    while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+        pairs.append((a_lo, b_lo))
+        a_lo += 1
+        b_lo += 1
+    suffix = 0
+    while a_lo < a_hi - suffix and b_lo < b_hi - suffix and a[a_hi - suffix - 1] == b[b_hi - suffix - 1]:
+        suffix += 1
+    a_hi -= suffix
+    b_hi -= suffix
+    return a_lo, a_hi, b_lo, b_hi, suffix
+
+
+def _diff_range(
+    a: Sequence[int], b: Sequence[int], a_lo: int, a_hi: int, b_lo: int, b_hi: int, pairs: List[Tuple[int, int]]
+) -> None:
+    a_lo, a_hi, b_lo, b_hi, suffix = _trim_common(a, b, a_lo, a_hi, b_lo, b_hi, pairs)
+
+    if a_lo < a_hi and b_lo < b_hi:
+        x, y, u, v = _middle_snake(a, b, a_lo, a_hi, b_lo, b_hi)
+        _diff_range(a, b, a_lo, x, b_lo, y, pairs)
+        pairs.extend((x + k, y + k) for k in range(u - x))
+        _diff_range(a, b, u, a_hi, v, b_hi, pairs)
+
+    pairs.extend((a_hi + k, b_hi + k) for k in range(suffix))
+
+
+def _middle_snake(
+    a: Sequence[int], b: Sequence[int], a_lo: int, a_hi: int, b_lo: int, b_hi: int
+) -> Tuple[int, int, int, int]:
+    # Forward paths run from the start on diagonal k = x - y; backward paths run
+    # from the end, where backward diagonal c lines up with forward k = delta - c.
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    delta = n - m
+    odd = delta % 2 == 1
+    offset = n + m + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in range((n + m + 1) // 2 + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            c = delta - k
+            if odd and -(d - 1) <= c <= d - 1 and x + backward[offset + c] >= n:
+                return a_lo + x0, b_lo + y0, a_lo + x, b_lo + y
+
+        for c in range(-d, d + 1, 2):
+            if c == -d or (c != d and backward[offset + c - 1] < backward[offset + c + 1]):
+                x = backward[offset + c + 1]
+            else:
+                x = backward[offset + c - 1] + 1
+            y = x - c
+            x0, y0 = x, y
+            while x < n and y < m and a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + c] = x
+            k = delta - c
+            if not odd and -d <= k <= d and x + forward[offset + k] >= n:
+                return a_hi - x, b_hi - y, a_hi - x0, b_hi - y0
+
+    raise AssertionError("no middle snake")
+
+
+def _opcodes(blocks: List[_Block], n: int, m: int) -> List[_Opcode]:
+    codes: List[_Opcode] = []
+    i = j = 0
+    for ai, bj, size in [*blocks, (n, m, 0)]:
+        if i < ai and j < bj:
+            codes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            codes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            codes.append(("insert", i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            codes.append(("equal", ai, i, bj, j))
+    return codes
+
+
+def _grouped(codes: List[_Opcode], n: int = CONTEXT_LINES) -> List[List[_Opcode]]:
+    # Same hunk grouping as SequenceMatcher.get_grouped_opcodes.
+    if not codes:
+        codes = [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    groups: List[List[_Opcode]] = []
+    group: List[_Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def build_diff(last_code: str, new_code: str, engine: DiffEngine = DIFF_ENGINES["auto"]) -> str:
+    if last_code == new_code:
+        return ""
+    a = last_code.splitlines()
+    b = new_code.splitlines()
+
+    # Lines are compared as small ints from here on; equal text gets the same id.
+    ids: Dict[str, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    if a_ids == b_ids:
+        return ""
+
+    filtered_lines: List[str] = []
+    for group in _grouped(_opcodes(engine.matching_blocks(a_ids, b_ids), len(a), len(b))):
+        first, last = group[0], group[-1]
+        filtered_lines.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag in ("replace", "delete"):
+                filtered_lines.extend("-" + line for line in a[i1:i2])
+            if tag in ("replace", "insert"):
+                filtered_lines.extend("+" + line for line in b[j1:j2])
+
+    # unified_diff's file headers were dropped by prefix, and so were changed lines that looked like them.
+    return "\n".join(
+        line for line in filtered_lines if not (line.startswith("--- ") or line.startswith("+++ "))
+    ).strip()
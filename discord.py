@@ -1,27 +1,61 @@
 from __future__ import annotations
 
-from typing import Optional
+import threading
+from typing import Any, Dict, List, Optional
 
-import requests
+from dispatcher import DeliveryResult, NotificationDispatcher, result_from_response
+from models import ChangeNotice, SnippetConfig
+from outbox import Outbox
+from ratelimit import TokenBucket
+from tracing import span
+from transport import HttpTransport, default_transport
 
-from models import SnippetConfig
+# Discord accepts up to 10 embeds per webhook message, 6000 characters in total.
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+# Per-embed limits that matter for digests.
+MAX_FIELDS_PER_EMBED = 25
+MAX_FIELD_NAME = 256
+MAX_FIELD_VALUE = 1024
+DIGEST_SUMMARY_CHARS = 300
+DIGEST_NOTE_CHARS = 200
+
+# Webhooks allow roughly 5 requests every 2 seconds.
+WEBHOOK_RATE = 2.5
+WEBHOOK_BURST = 5
+
+
+def _clip(text: str, limit: int, marker: str = "…") -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + marker
+
+
+def embed_size(embed: Dict[str, Any]) -> int:
+    size = len(embed.get("title") or "") + len(embed.get("description") or "")
+    for field in embed.get("fields") or []:
+        size += len(field.get("name") or "") + len(field.get("value") or "")
+    return size
 
 
 class DiscordNotifier:
-    def __init__(self, webhook_url: str):
+    channel = "discord"
+
+    def __init__(self, webhook_url: str, transport: Optional[HttpTransport] = None, outbox: Optional[Outbox] = None):
         self.webhook_url = webhook_url or ""
+        self.transport = transport or default_transport()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.dispatcher = NotificationDispatcher(self, outbox) if outbox is not None else None
 
-    def notify_change(
+    def render_embed(
         self,
         snippet: SnippetConfig,
         diff_text: str,
         diff_summary: Optional[str] = None,
         diff_source: Optional[str] = None,
-    ) -> None:
-        if not self.webhook_url:
-            print("No webhook URL configured; skipping Discord notification.")
-            return
-
+    ) -> Dict[str, Any]:
         title = f"Code change detected in {snippet.owner}/{snippet.repo}"
         description = (
             f"**File:** {snippet.file_url}\n"
@@ -32,32 +66,129 @@ class DiscordNotifier:
         fields = []
         if diff_summary:
             label = f"Diff summary ({diff_source})" if diff_source else "Diff summary"
-            trimmed = diff_summary.strip()
-            if len(trimmed) > 1900:
-                trimmed = trimmed[:1900] + "…"
+            trimmed = _clip(diff_summary.strip(), 1900)
             fields.append({"name": label, "value": trimmed, "inline": False})
 
-        code_block = diff_text or "No diff text available"
-        if len(code_block) > 1800:
-            code_block = code_block[:1800] + "\n…"
+        code_block = _clip(diff_text or "No diff text available", 1800, "\n…")
 
         fields.append({"name": "Code change diff", "value": f"```diff\n{code_block}\n```", "inline": False})
 
-        payload = {
-            "content": None,
-            "embeds": [
-                {
-                    "title": title,
-                    "description": description,
-                    "fields": fields,
-                }
-            ],
+        return {
+            "title": title,
+            "description": description,
+            "fields": fields,
         }
 
+    def render_digest_field(self, notice: ChangeNotice) -> Dict[str, Any]:
+        snippet = notice.snippet
+        name = f"{snippet.owner}/{snippet.repo} · {snippet.file_path} L{snippet.start_line}-L{snippet.end_line}"
+        lines = [f"**Note:** {_clip(snippet.note or '—', DIGEST_NOTE_CHARS)}"]
+        if notice.diff_summary:
+            label = f"Summary ({notice.diff_source})" if notice.diff_source else "Summary"
+            lines.append(f"**{label}:** {_clip(notice.diff_summary.strip(), DIGEST_SUMMARY_CHARS)}")
+        head = "\n".join(lines) + "\n"
+        fence = "```diff\n{}\n```"
+        # Whatever the note and summary leave of the field goes to the diff.
+        budget = max(0, MAX_FIELD_VALUE - len(head) - len(fence.format("")) - 2)
+        code_block = _clip(notice.diff_text or "No diff text available", budget, "\n…")
+        return {"name": _clip(name, MAX_FIELD_NAME - 1), "value": head + fence.format(code_block), "inline": False}
+
+    def render_digest(self, notices: List[ChangeNotice]) -> List[Dict[str, Any]]:
+        payloads: List[Dict[str, Any]] = []
+        fields: List[Dict[str, Any]] = []
+        title_room = 64
+        size = title_room
+        for notice in notices:
+            field = self.render_digest_field(notice)
+            field_size = len(field["name"]) + len(field["value"])
+            if fields and (len(fields) >= MAX_FIELDS_PER_EMBED or size + field_size > MAX_EMBED_CHARS_PER_MESSAGE):
+                payloads.append({"content": None, "embeds": [{"fields": fields}]})
+                fields, size = [], title_room
+            fields.append(field)
+            size += field_size
+        if fields:
+            payloads.append({"content": None, "embeds": [{"fields": fields}]})
+
+        for part, payload in enumerate(payloads, start=1):
+            title = f"{len(notices)} code change{'s' if len(notices) != 1 else ''} detected"
+            if len(payloads) > 1:
+                title += f" ({part}/{len(payloads)})"
+            payload["embeds"][0]["title"] = title
+        return payloads
+
+    def notify_change(
+        self,
+        snippet: SnippetConfig,
+        diff_text: str,
+        diff_summary: Optional[str] = None,
+        diff_source: Optional[str] = None,
+    ) -> bool:
+        if not self.webhook_url:
+            print("No webhook URL configured; skipping Discord notification.")
+            return False
+
+        payload = {"content": None, "embeds": [self.render_embed(snippet, diff_text, diff_summary, diff_source)]}
+        if self.dispatcher is not None:
+            self.dispatcher.enqueue(self.webhook_url, payload)
+            return True
+        return self.send(self.webhook_url, [payload]).ok
+
+    def notify_digest(self, notices: List[ChangeNotice]) -> bool:
+        if not self.webhook_url:
+            print("No webhook URL configured; skipping Discord notification.")
+            return False
+
+        payloads = self.render_digest(notices)
+        if self.dispatcher is not None:
+            for payload in payloads:
+                self.dispatcher.enqueue(self.webhook_url, payload)
+            return True
+        return all([self.send(self.webhook_url, [payload]).ok for payload in payloads])
+
+    def pack(self, payloads: List[Dict[str, Any]]) -> int:
+        embeds = 0
+        chars = 0
+        for count, payload in enumerate(payloads):
+            size = sum(embed_size(e) for e in payload["embeds"])
+            if count and (
+                embeds + len(payload["embeds"]) > MAX_EMBEDS_PER_MESSAGE or chars + size > MAX_EMBED_CHARS_PER_MESSAGE
+            ):
+                return count
+            embeds += len(payload["embeds"])
+            chars += size
+        return len(payloads)
+
+    def throttle(self, target: str) -> float:
+        with self._lock:
+            bucket = self._buckets.get(target)
+            if bucket is None:
+                bucket = self._buckets[target] = TokenBucket(WEBHOOK_RATE, WEBHOOK_BURST)
+        wait = bucket.wait_time()
+        if wait == 0:
+            bucket.take()
+        return wait
+
+    def send(self, target: str, payloads: List[Dict[str, Any]]) -> DeliveryResult:
+        payload = {"content": None, "embeds": [e for p in payloads for e in p["embeds"]]}
         try:
-            resp = requests.post(self.webhook_url, json=payload, timeout=10)
-            if resp.status_code >= 400:
-                print(f"Failed to send Discord notification: {resp.status_code} {resp.text}")
+            with span("discord.send", embeds=len(payload["embeds"])) as attrs:
+                resp = self.transport.post(target, json=payload)
+                attrs["status"] = resp.status_code
         except Exception as e:
             print(f"Error sending Discord notification: {e}")
+            return DeliveryResult(ok=False, error=str(e))
+
+        retry_after = None
+        if resp.status_code == 429:
+            try:
+                retry_after = float(resp.json().get("retry_after"))
+            except Exception:
+                retry_after = None
+        result = result_from_response(resp, retry_after)
+        if not result.ok:
+            print(f"Failed to send Discord notification: {resp.status_code} {resp.text}")
+        return result
 
+    def close(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.close()
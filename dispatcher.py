@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Protocol
+
+from metrics import DELIVERIES, OUTBOX_PENDING, RATE_LIMIT_HITS
+from outbox import Outbox, OutboxMessage
+from ratelimit import parse_retry_after
+
+
+@dataclass(slots=True)
+class DeliveryResult:
+    ok: bool
+    retry_after: Optional[float] = None
+    permanent: bool = False
+    error: str = ""
+
+
+class DeliveryChannel(Protocol):
+    channel: str
+
+    def pack(self, payloads: List[Dict[str, Any]]) -> int: ...
+
+    def throttle(self, target: str) -> float: ...
+
+    def send(self, target: str, payloads: List[Dict[str, Any]]) -> DeliveryResult: ...
+
+
+def result_from_response(resp: Any, retry_after: Optional[float] = None) -> DeliveryResult:
+    status = resp.status_code
+    if status < 300:
+        return DeliveryResult(ok=True)
+    error = f"{status} {resp.text[:200]}"
+    if status == 429:
+        if retry_after is None:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        return DeliveryResult(ok=False, retry_after=retry_after, error=error)
+    # Other client errors will fail the same way on every retry.
+    return DeliveryResult(ok=False, permanent=400 <= status < 500, error=error)
+
+
+class NotificationDispatcher:
+    MAX_ATTEMPTS = 10
+    BASE_BACKOFF = 2.0
+    MAX_BACKOFF = 600.0
+    IDLE_WAIT = 5.0
+
+    def __init__(self, channel: DeliveryChannel, outbox: Outbox):
+        self.channel = channel
+        self.outbox = outbox
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._blocked_until: Dict[str, float] = {}
+        self._thread = threading.Thread(target=self._run, name=f"{channel.channel}-dispatcher", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, target: str, payload: Dict[str, Any]) -> None:
+        self.outbox.put(self.channel.channel, target, payload)
+        self._wake.set()
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        pending = self.outbox.pending(self.channel.channel)
+        if pending:
+            print(f"Resuming delivery of {pending} queued {self.channel.channel} notification(s)")
+        while not self._stop.is_set():
+            try:
+                delay = self._deliver_due()
+                OUTBOX_PENDING.set(self.outbox.pending(self.channel.channel), channel=self.channel.channel)
+            except Exception as e:
+                print(f"Error in {self.channel.channel} dispatcher: {e}")
+                delay = self.IDLE_WAIT
+            if delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+
+    def _deliver_due(self) -> float:
+        now = time.time()
+        messages = self.outbox.due(self.channel.channel, now)
+        if not messages:
+            next_due = self.outbox.next_due(self.channel.channel)
+            if next_due is None:
+                return self.IDLE_WAIT
+            return min(max(next_due - now, 0.05), self.IDLE_WAIT)
+
+        by_target: Dict[str, List[OutboxMessage]] = {}
+        for message in messages:
+            by_target.setdefault(message.target, []).append(message)
+
+        # A throttled target must not hold up messages for the others.
+        wait = self.IDLE_WAIT
+        for target, queued in by_target.items():
+            # After a failure the whole target waits, so later messages neither
+            # overtake the rescheduled ones nor run into the same rate limit.
+            blocked = self._blocked_until.get(target, 0.0) - now
+            if blocked > 0:
+                wait = min(wait, blocked)
+                continue
+            throttle = self.channel.throttle(target)
+            if throttle > 0:
+                wait = min(wait, throttle)
+                continue
+            count = max(1, self.channel.pack([m.payload for m in queued]))
+            self._send(target, queued[:count])
+            return 0.0
+        return wait
+
+    def _send(self, target: str, batch: List[OutboxMessage]) -> None:
+        ids = [m.id for m in batch]
+        try:
+            result = self.channel.send(target, [m.payload for m in batch])
+        except Exception as e:
+            result = DeliveryResult(ok=False, error=str(e))
+
+        name = self.channel.channel
+        if result.ok:
+            DELIVERIES.inc(channel=name, result="sent")
+            self.outbox.delete(ids)
+            self._blocked_until.pop(target, None)
+            return
+
+        if result.retry_after is not None:
+            DELIVERIES.inc(channel=name, result="rate_limited")
+            RATE_LIMIT_HITS.inc(service=name)
+            print(f"{name} rate limited; retrying {len(ids)} message(s) in {result.retry_after:.1f}s")
+            self._block(target, time.time() + result.retry_after)
+            self.outbox.reschedule(ids, self._blocked_until[target], result.error, count_attempt=False)
+            return
+
+        DELIVERIES.inc(channel=name, result="failed")
+        if result.permanent and len(batch) > 1:
+            # One bad message should not take the rest of a packed request down with it.
+            for message in batch:
+                self._send(target, [message])
+            return
+
+        attempts = max(m.attempts for m in batch) + 1
+        if result.permanent or attempts >= self.MAX_ATTEMPTS:
+            print(f"Dropping {len(ids)} {name} message(s) after {attempts} attempt(s): {result.error}")
+            self.outbox.delete(ids)
+            return
+
+        delay = min(self.MAX_BACKOFF, self.BASE_BACKOFF * 2 ** (attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+        print(f"Failed to send {len(ids)} {name} message(s) ({result.error}); retrying in {delay:.1f}s")
+        self._block(target, time.time() + delay)
+        self.outbox.reschedule(ids, self._blocked_until[target], result.error)
+
+    def _block(self, target: str, until: float) -> None:
+        self._blocked_until[target] = max(until, self._blocked_until.get(target, 0.0))
@@ -1,11 +1,22 @@
 import argparse
+import os
 import sys
 import getpass
 from typing import Optional
+from urllib.parse import urlparse
 
 from config_manager import ConfigManager
+from diff_engine import DIFF_ENGINES
+from git_mirror import GitError, GitMirrorClient
 from github_client import GitHubClient
+from github_graphql import GraphQLClient
+from metrics import start_metrics_server
+from http_cache import ResponseCache
+from outbox import Outbox
+from transport import HttpTransport
 from models import SnippetConfig
+from normalize import NORMALIZE_MODES, fingerprint
+from router import NotificationRouter
 from monitor import SnippetMonitor
 from discord import DiscordNotifier
 from telegram import TelegramNotifier
@@ -28,14 +39,61 @@ def build_arg_parser() -> argparse.ArgumentParser:
     )
 
     parser.add_argument("--note", help="Custom note describing why this snippet is important. Used with --add.")
+    parser.add_argument(
+        "--anchored",
+        action="store_true",
+        help="Follow the snippet when lines above it are inserted or removed instead of alerting. Used with --add.",
+    )
+    parser.add_argument(
+        "--channels",
+        help="Comma-separated channels to alert for this snippet, e.g. discord,telegram (default: all). Used with --add.",
+    )
+    parser.add_argument(
+        "--priority",
+        choices=["high", "normal", "low"],
+        help="Polling priority when the GitHub request budget runs low (default: normal). Used with --add.",
+    )
+    parser.add_argument(
+        "--normalize",
+        choices=NORMALIZE_MODES,
+        help="Ignore whitespace, comment and trailing-comma changes, tokenizing as this language "
+        "(auto picks it from the file extension). Used with --add.",
+    )
     parser.add_argument("--time", type=int, help="Polling interval (seconds) for the daemon.")
     parser.add_argument("--ai", help="AI provider to use for diff summaries: gemini | openai | ollama")
     parser.add_argument("--model", help="Model name for the selected provider.")
     parser.add_argument("--run", action="store_true", help="Start monitoring daemon.")
     parser.add_argument("--init", action="store_true", help="Interactively prompt to add missing API keys / Discord webhook")
-    notify = parser.add_mutually_exclusive_group()
-    notify.add_argument("--discord", action="store_true", help="Send notifications via Discord webhook.")
-    notify.add_argument("--telegram", action="store_true", help="Send notifications via Telegram bot.")
+    parser.add_argument("--discord", action="store_true", help="Send notifications via Discord webhook.")
+    parser.add_argument("--telegram", action="store_true", help="Send notifications via Telegram bot.")
+    parser.add_argument(
+        "--digest",
+        action="store_true",
+        help="Send one digest per cycle (or per digest_window_seconds) instead of a message per change.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["http", "git", "graphql"],
+        help="How the daemon reads files: raw HTTP requests, a local git mirror, or batched GraphQL queries "
+        "(default: fetch_backend in config.json).",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on this local port while the daemon runs (default: metrics_port in config.json).",
+    )
+    parser.add_argument("--trace", metavar="DIR", help="Write a span trace of every monitoring cycle to DIR.")
+    parser.add_argument(
+        "--trace-format",
+        choices=["jsonl", "chrome"],
+        default="jsonl",
+        help="Trace file format: JSON lines, or Chrome trace events for chrome://tracing and Perfetto (default: jsonl).",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Sample every thread during each cycle and write folded stacks for flame graphs to DIR.",
+    )
 
     return parser
 
@@ -73,6 +131,15 @@ def prompt_if_missing(config_manager: ConfigManager) -> None:
     else:
         print("telegram_chat_id already set in config.json")
 
+    if not config.github_token:
+        val = getpass.getpass("GitHub token (raises rate limits, needed for private repos) [skip]: ").strip()
+        if val:
+            config.github_token = val
+            changed = True
+            print("Saved github_token to config.json")
+    else:
+        print("github_token already set in config.json")
+
     if not config.openai_key:
         val = getpass.getpass("OpenAI API key [skip]: ").strip()
         if val:
@@ -150,8 +217,9 @@ def handle_add(args, config_manager: ConfigManager, github_client: GitHubClient)
         print(f"Snippet already configured: {parsed.file_url}")
         return
 
-    content = github_client.fetch_file_content(parsed)
-    snippet_text = github_client.extract_lines(content, parsed.start_line, parsed.end_line)
+    fetch = github_client.fetch_file(parsed, max_line=None if args.anchored else parsed.end_line)
+    snippet_text = github_client.extract_lines(fetch.content, parsed.start_line, parsed.end_line)
+    digest = config_manager.state.put_blob(snippet_text)
 
     new_snippet = SnippetConfig(
         id=snippet_id,
@@ -163,8 +231,14 @@ def handle_add(args, config_manager: ConfigManager, github_client: GitHubClient)
         end_line=parsed.end_line,
         file_url=parsed.file_url,
         note=args.note or "",
-        original_code=snippet_text,
-        last_seen_code=snippet_text,
+        anchored=bool(args.anchored),
+        channels=[c.strip().lower() for c in (args.channels or "").split(",") if c.strip()],
+        priority=args.priority or "normal",
+        normalize=args.normalize or "",
+        original_digest=digest,
+        last_seen_digest=digest,
+        last_seen_fingerprint=fingerprint(snippet_text, args.normalize, parsed.file_path) if args.normalize else "",
+        last_seen_etag=fetch.etag,
     )
 
     if config.snippets is None:
@@ -195,8 +269,21 @@ def main() -> None:
     args = parser.parse_args()
 
     config_manager = ConfigManager()
-    github_client = GitHubClient()
     config = config_manager.load()
+    transport = HttpTransport(
+        pool_size=config.http_pool_size,
+        retries=config.http_retries,
+        timeout=config.http_timeout,
+        host_pool_sizes={urlparse(config.raw_base_url or GitHubClient.GITHUB_RAW_BASE).netloc: config.fetch_per_host},
+    )
+    github_token = config.github_token or os.environ.get("GITHUB_TOKEN")
+    github_client = GitHubClient(
+        cache=ResponseCache(os.path.join(config.cache_dir, "http")),
+        transport=transport,
+        git_base_url=config.git_base_url or None,
+        token=github_token,
+        raw_base_url=config.raw_base_url or None,
+    )
 
     if args.init:
         prompt_if_missing(config_manager)
@@ -227,25 +314,81 @@ def main() -> None:
         print("No snippets configured in config.json. Add at least one with --add before running daemon.")
         return
 
-    use_telegram = bool(args.telegram)
-    use_discord = bool(args.discord) or not use_telegram
+    # Without --discord/--telegram, every channel that is configured is used.
+    has_discord = bool(config.webhook_url)
+    has_telegram = bool(config.telegram_bot_token and config.telegram_chat_id)
+    use_discord = bool(args.discord) or (not args.telegram and has_discord)
+    use_telegram = bool(args.telegram) or (not args.discord and has_telegram)
+
+    if not use_discord and not use_telegram:
+        print(
+            "No Discord webhook or Telegram bot configured in config.json. "
+            "Run with --init to add values interactively, or edit config.json."
+        )
+        return
+    if use_discord and not has_discord:
+        print(
+            "No Discord webhook configured in config.json. Run with --init to add values interactively, or edit config.json."
+        )
+        return
+    if use_telegram and not has_telegram:
+        print(
+            "Telegram selected but telegram_bot_token or telegram_chat_id missing in config.json. "
+            "Run with --init to add values interactively, or edit config.json."
+        )
+        return
 
-    notifier = None
-    if use_discord:
-        if not config.webhook_url:
-            print(
-                "No Discord webhook configured in config.json. Run with --init to add values interactively, or edit config.json."
+    backend = args.backend or config.fetch_backend
+    if backend == "git":
+        try:
+            # One fetch per repository per cycle replaces the per-file requests.
+            github_client = GitMirrorClient(
+                os.path.join(config.cache_dir, "mirrors"),
+                git_base_url=config.git_base_url or None,
+                token=github_token,
             )
+        except GitError as e:
+            print(e)
             return
-        notifier = DiscordNotifier(webhook_url=config.webhook_url)
-    else:
-        if not config.telegram_bot_token or not config.telegram_chat_id:
-            print(
-                "Telegram selected but telegram_bot_token or telegram_chat_id missing in config.json. "
-                "Run with --init to add values interactively, or edit config.json."
-            )
+    elif backend == "graphql":
+        if not github_token and not config.graphql_url:
+            print("The graphql backend needs github_token in config.json (or GITHUB_TOKEN). Run with --init to add it.")
+            return
+        # Changed files are read in a few batched queries; anything they miss falls back to raw requests.
+        github_client = GraphQLClient(
+            cache=github_client.cache,
+            transport=transport,
+            git_base_url=config.git_base_url or None,
+            token=github_token,
+            graphql_url=config.graphql_url or None,
+            raw_base_url=config.raw_base_url or None,
+        )
+    elif backend != "http":
+        print("fetch_backend must be one of: http | git | graphql")
+        return
+
+    if config.diff_engine not in DIFF_ENGINES:
+        print("diff_engine must be one of: " + " | ".join(DIFF_ENGINES))
+        return
+    for snippet in config.snippets:
+        if snippet.normalize and snippet.normalize not in NORMALIZE_MODES:
+            print(f"normalize for {snippet.file_url} must be one of: " + " | ".join(NORMALIZE_MODES))
             return
-        notifier = TelegramNotifier(bot_token=config.telegram_bot_token, chat_id=config.telegram_chat_id)
+
+    # Undelivered notifications are kept here and resent after a restart.
+    outbox = Outbox(os.path.join(os.path.dirname(config_manager.state_path), "outbox.db"))
+    channels = {}
+    if use_discord:
+        channels["discord"] = DiscordNotifier(webhook_url=config.webhook_url, transport=transport, outbox=outbox)
+    if use_telegram:
+        channels["telegram"] = TelegramNotifier(
+            bot_token=config.telegram_bot_token,
+            chat_id=config.telegram_chat_id,
+            transport=transport,
+            outbox=outbox,
+            api_base=config.telegram_api_base or None,
+        )
+    notifier = NotificationRouter(channels, timeout=config.notify_timeout_seconds)
 
     provider = args.ai.lower() if args.ai else None
     if provider:
@@ -274,10 +417,25 @@ def main() -> None:
         debug=True,
         provider=provider,
         model=run_model,
+        transport=transport,
+        digest=args.digest,
+        trace_dir=args.trace,
+        trace_format=args.trace_format,
+        profile_dir=args.profile,
     )
 
+    metrics_port = args.metrics_port if args.metrics_port is not None else config.metrics_port
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
     print("Starting monitoring daemon... Press Ctrl+C to stop.")
-    monitor.run_forever()
+    try:
+        monitor.run_forever()
+    finally:
+        notifier.close()
+        outbox.close()
+        if isinstance(github_client, GitMirrorClient):
+            github_client.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class ConcurrentFetcher:
+    def __init__(self, max_workers: int = 8, per_host_limit: int = 4):
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def host_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = slots
+            return slots
+
+    def map(
+        self,
+        fn: Callable[[T], R],
+        items: Sequence[T],
+        host_of: Callable[[T], str],
+    ) -> List[Tuple[Optional[R], Optional[Exception]]]:
+        if not items:
+            return []
+
+        def run(item: T) -> R:
+            with self.host_slot(host_of(item)):
+                return fn(item)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            futures = [pool.submit(run, item) for item in items]
+
+        results: List[Tuple[Optional[R], Optional[Exception]]] = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
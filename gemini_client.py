@@ -1,42 +1,58 @@
-import requests
-from typing import Optional
+from typing import List, Optional
+
+from ai_batch import SINGLE_SYSTEM_PROMPT, DiffRequest, render_single, summarize_in_batches
+from tracing import span
+from transport import HttpTransport, default_transport
 
 
 class GeminiClient:
-    def __init__(self, api_key: str, model: str, endpoint: Optional[str] = None):
+    BATCH_TOKEN_BUDGET = 12000
+    BATCH_MAX_ITEMS = 20
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        endpoint: Optional[str] = None,
+        transport: Optional[HttpTransport] = None,
+    ):
         self.api_key = api_key
         self.model = model
+        self.transport = transport or default_transport()
         self.base_endpoint = (endpoint or "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
 
-    def summarize_diff(self, diff_text: str) -> Optional[str]:
+    def summarize_diff(self, diff_text: str, note: str = "") -> Optional[str]:
         if not diff_text.strip():
             return None
+        return self.complete(SINGLE_SYSTEM_PROMPT, render_single(diff_text, note))
+
+    def summarize_diffs(self, requests: List[DiffRequest]) -> List[Optional[str]]:
+        return summarize_in_batches(self, requests)
+
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> Optional[str]:
         url = f"{self.base_endpoint}/models/{self.model}:generateContent"
-        system_instruction = (
-            "You are a code review assistant. The user will send you a unified diff for a SMALL CODE SNIPPET, "
-            "not the whole file. The diff only includes changed lines (and sometimes @@ hunk headers). "
-            "Summarize the change in 1–3 short bullet points, focusing on behavior changes, security impact, "
-            "and configuration changes. Reply in plain text, no markdown code fences."
-        )
-        user_text = f"Here is the diff:\n\n{diff_text}"
         payload = {
             "contents": [
                 {
                     "role": "user",
                     "parts": [
-                        {"text": system_instruction},
+                        {"text": system_prompt},
                         {"text": "\n\n"},
-                        {"text": user_text},
+                        {"text": user_prompt},
                     ],
                 }
             ]
         }
+        if max_tokens:
+            payload["generationConfig"] = {"maxOutputTokens": max_tokens}
         headers = {
             "Content-Type": "application/json",
             "x-goog-api-key": self.api_key,
         }
         try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=30)
+            with span("ai.complete", provider="gemini", model=self.model, prompt_chars=len(user_prompt)) as attrs:
+                resp = self.transport.post(url, json=payload, headers=headers, timeout=30)
+                attrs["status"] = resp.status_code
             resp.raise_for_status()
             data = resp.json()
             candidates = data.get("candidates") or []
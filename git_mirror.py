@@ -0,0 +1,202 @@
+import os
+import shutil
+import subprocess
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from github_client import COMMIT_SHA_RE, FileFetch, GitHubClient, ParsedGitHubURL
+from metrics import GIT_SECONDS
+from tracing import span
+from ratelimit import RequestBudget
+
+MIRROR_HOST = "git-mirror"
+
+
+class GitError(Exception):
+    pass
+
+
+class _CatFile:
+    # One long-lived `git cat-file --batch` per mirror, so reading a file
+    # costs a pipe round trip rather than a process spawn.
+    def __init__(self, env: Dict[str, str], git_dir: str):
+        self._proc = subprocess.Popen(
+            ["git", "--git-dir", git_dir, "cat-file", "--batch"],
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._lock = threading.Lock()
+
+    def read(self, spec: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            self._proc.stdin.write(spec.encode("utf-8") + b"\n")
+            self._proc.stdin.flush()
+            header = self._proc.stdout.readline().decode("utf-8", "replace").split()
+            if len(header) != 3:
+                return None
+            oid, kind, size = header
+            data = self._proc.stdout.read(int(size))
+            self._proc.stdout.read(1)
+        if kind != "blob":
+            return None
+        return oid, data
+
+    def close(self) -> None:
+        with self._lock:
+            self._proc.stdin.close()
+            self._proc.wait()
+
+
+class GitMirrorClient(GitHubClient):
+    def __init__(
+        self,
+        mirror_dir: str,
+        git_base_url: Optional[str] = None,
+        token: Optional[str] = None,
+        budget: Optional[RequestBudget] = None,
+        timeout: int = 300,
+    ):
+        if shutil.which("git") is None:
+            raise GitError("The git mirror backend needs the git executable on PATH")
+        super().__init__(git_base_url=git_base_url, token=token, budget=budget)
+        self.mirror_dir = mirror_dir
+        self.timeout = timeout
+        self._repo_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._cat_files: Dict[Tuple[str, str], _CatFile] = {}
+        self._fetched: Set[Tuple[str, str]] = set()
+        self._changed_paths: Dict[Tuple[str, str, str, str], Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def start_cycle(self) -> None:
+        with self._lock:
+            self._fetched.clear()
+            self._changed_paths.clear()
+
+    def host_for(self, parsed: ParsedGitHubURL) -> str:
+        return MIRROR_HOST
+
+    def git_host(self) -> str:
+        return MIRROR_HOST
+
+    def _git_dir(self, owner: str, repo: str) -> str:
+        return os.path.join(self.mirror_dir, owner, f"{repo}.git")
+
+    def _remote_url(self, owner: str, repo: str) -> str:
+        return f"{self.git_base_url}/{owner}/{repo}.git"
+
+    def _git_env(self, owner: str, repo: str) -> Dict[str, str]:
+        # Credentials are passed per command rather than stored in the mirror's
+        # config, and through the environment so they never show up in argv.
+        env = dict(os.environ)
+        count = int(env.get("GIT_CONFIG_COUNT") or 0)
+        for name, value in self._auth_headers(self._remote_url(owner, repo)).items():
+            env[f"GIT_CONFIG_KEY_{count}"] = "http.extraHeader"
+            env[f"GIT_CONFIG_VALUE_{count}"] = f"{name}: {value}"
+            count += 1
+        env["GIT_CONFIG_COUNT"] = str(count)
+        return env
+
+    def _git(self, args: List[str], git_dir: Optional[str] = None, repo: Optional[Tuple[str, str]] = None) -> str:
+        cmd = ["git"]
+        if git_dir:
+            cmd += ["--git-dir", git_dir]
+        env = self._git_env(*repo) if repo else None
+        with GIT_SECONDS.time(command=args[0]), span("git", command=args[0]):
+            result = subprocess.run(cmd + args, env=env, capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise GitError(f"git {args[0]} failed: {result.stderr.strip()[:300]}")
+        return result.stdout
+
+    def _repo_lock(self, owner: str, repo: str) -> threading.Lock:
+        with self._lock:
+            return self._repo_locks.setdefault((owner, repo), threading.Lock())
+
+    def sync_repo(self, owner: str, repo: str) -> str:
+        git_dir = self._git_dir(owner, repo)
+        with self._repo_lock(owner, repo):
+            if (owner, repo) in self._fetched:
+                return git_dir
+            if not os.path.isdir(git_dir):
+                os.makedirs(os.path.dirname(git_dir), exist_ok=True)
+                print(f"Creating mirror of {owner}/{repo} in {git_dir}")
+                # Blobless: commits and trees come now, file contents on first read.
+                self._git(
+                    ["clone", "--bare", "--filter=blob:none", "--quiet", self._remote_url(owner, repo), git_dir],
+                    repo=(owner, repo),
+                )
+            else:
+                self._git(
+                    [
+                        "fetch",
+                        "--prune",
+                        "--quiet",
+                        "origin",
+                        "+refs/heads/*:refs/heads/*",
+                        "+refs/tags/*:refs/tags/*",
+                    ],
+                    git_dir=git_dir,
+                    repo=(owner, repo),
+                )
+            with self._lock:
+                self._fetched.add((owner, repo))
+        return git_dir
+
+    def resolve_head(self, owner: str, repo: str, branch: str) -> Optional[str]:
+        git_dir = self.sync_repo(owner, repo)
+        if COMMIT_SHA_RE.fullmatch(branch):
+            return branch
+        for ref_name in (f"refs/heads/{branch}", f"refs/tags/{branch}"):
+            try:
+                return self._git(["rev-parse", "--verify", "--quiet", f"{ref_name}^{{commit}}"], git_dir).strip()
+            except GitError:
+                continue
+        return None
+
+    def changed_paths(self, owner: str, repo: str, old: str, new: str) -> Optional[Set[str]]:
+        key = (owner, repo, old, new)
+        with self._lock:
+            cached = self._changed_paths.get(key)
+        if cached is not None:
+            return cached
+        try:
+            output = self._git(["diff", "--name-only", "--no-renames", f"{old}..{new}"], self.sync_repo(owner, repo))
+        except GitError:
+            # The old commit may have been force-pushed away; read the files instead.
+            return None
+        paths = set(output.splitlines())
+        with self._lock:
+            self._changed_paths[key] = paths
+        return paths
+
+    def _cat_file(self, owner: str, repo: str) -> _CatFile:
+        with self._lock:
+            reader = self._cat_files.get((owner, repo))
+            if reader is None:
+                reader = self._cat_files[(owner, repo)] = _CatFile(self._git_env(owner, repo), self._git_dir(owner, repo))
+            return reader
+
+    def fetch_file(
+        self,
+        parsed: ParsedGitHubURL,
+        ref: Optional[str] = None,
+        max_line: Optional[int] = None,
+    ) -> FileFetch:
+        ref = ref or self.resolve_head(parsed.owner, parsed.repo, parsed.branch)
+        if not ref:
+            raise GitError(f"Branch {parsed.branch} not found in {parsed.owner}/{parsed.repo}")
+        self.sync_repo(parsed.owner, parsed.repo)
+        found = self._cat_file(parsed.owner, parsed.repo).read(f"{ref}:{parsed.file_path}")
+        if found is None:
+            raise GitError(f"{parsed.file_path} not found at {ref[:12]} in {parsed.owner}/{parsed.repo}")
+        oid, data = found
+        # The blob id names the exact content, so it doubles as the ETag.
+        return FileFetch(content=data.decode("utf-8", "replace"), etag=f'"{oid}"')
+
+    def close(self) -> None:
+        with self._lock:
+            readers = list(self._cat_files.values())
+            self._cat_files.clear()
+        for reader in readers:
+            reader.close()
@@ -1,12 +1,16 @@
+import base64
 import re
 from dataclasses import dataclass
-from typing import Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse
 
-import requests
+from http_cache import CachedResponse, ResponseCache
+from ratelimit import RequestBudget
+from tracing import span
+from transport import HttpTransport, default_transport
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedGitHubURL:
     owner: str
     repo: str
@@ -17,8 +21,102 @@ class ParsedGitHubURL:
     file_url: str
 
 
+@dataclass(slots=True)
+class FileFetch:
+    content: str
+    etag: str = ""
+    not_modified: bool = False
+
+
+@dataclass(slots=True)
+class FileRequest:
+    parsed: ParsedGitHubURL
+    ref: Optional[str] = None
+    # ETag every snippet of the file last saw, if they all agree.
+    known_etag: str = ""
+
+
+STREAM_CHUNK_SIZE = 64 * 1024
+# Stopping a download early drops the keep-alive connection, so bodies below
+# this size are always read whole.
+FULL_READ_LIMIT = 256 * 1024
+
+# Longest a single request may wait for the request budget before the
+# snippet is deferred instead.
+MAX_PACE_WAIT = 10.0
+
+# Credentials are only ever sent to these hosts.
+GITHUB_HOST_SUFFIXES = ("github.com", "githubusercontent.com")
+
+COMMIT_SHA_RE = re.compile(r"[0-9a-f]{40}|[0-9a-f]{64}")
+
+
+def _encoded(resp) -> bool:
+    return resp.headers.get("Content-Encoding", "identity").lower() not in ("", "identity")
+
+
+def parse_pkt_lines(data: bytes) -> List[bytes]:
+    lines: List[bytes] = []
+    pos = 0
+    while pos + 4 <= len(data):
+        length = int(data[pos : pos + 4], 16)
+        if length < 4:
+            # flush-pkt, delim-pkt or response-end-pkt
+            pos += 4
+            continue
+        lines.append(data[pos + 4 : pos + length])
+        pos += length
+    return lines
+
+
+def pkt_line(text: str) -> bytes:
+    payload = text.encode("utf-8")
+    return f"{len(payload) + 4:04x}".encode("ascii") + payload
+
+
 class GitHubClient:
     GITHUB_RAW_BASE = "https://raw.githubusercontent.com"
+    GITHUB_GIT_BASE = "https://github.com"
+
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        transport: Optional[HttpTransport] = None,
+        git_base_url: Optional[str] = None,
+        token: Optional[str] = None,
+        budget: Optional[RequestBudget] = None,
+        raw_base_url: Optional[str] = None,
+    ):
+        self.cache = cache
+        self.transport = transport or default_transport()
+        self.git_base_url = (git_base_url or self.GITHUB_GIT_BASE).rstrip("/")
+        self.raw_base_url = (raw_base_url or self.GITHUB_RAW_BASE).rstrip("/")
+        self.token = (token or "").strip()
+        self.budget = budget or RequestBudget()
+
+    def _auth_headers(self, url: str) -> Dict[str, str]:
+        host = urlparse(url).hostname or ""
+        if not self.token or not any(host == s or host.endswith("." + s) for s in GITHUB_HOST_SUFFIXES):
+            return {}
+        if url.startswith(self.git_base_url):
+            # Smart HTTP only takes basic auth; GitHub accepts a token as the password.
+            credentials = base64.b64encode(f"x-access-token:{self.token}".encode("utf-8")).decode("ascii")
+            return {"Authorization": f"Basic {credentials}"}
+        return {"Authorization": f"token {self.token}"}
+
+    def _request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs):
+        with span("github.pace"):
+            self.budget.pace(MAX_PACE_WAIT)
+        headers = {**(headers or {}), **self._auth_headers(url)}
+        with span("github.request", method=method, url=url) as attrs:
+            if method == "POST":
+                resp = self.transport.post(url, headers=headers, **kwargs)
+            else:
+                resp = self.transport.get(url, headers=headers, **kwargs)
+            attrs["status"] = resp.status_code
+        body = resp.text if resp.status_code in (403, 429) else ""
+        self.budget.observe(resp.status_code, resp.headers, body)
+        return resp
 
     def parse_github_url(self, url: str) -> ParsedGitHubURL:
         parsed = urlparse(url)
@@ -62,17 +160,181 @@ class GitHubClient:
             file_url=url,
         )
 
-    def build_raw_url(self, parsed: ParsedGitHubURL) -> str:
-        return f"{self.GITHUB_RAW_BASE}/{parsed.owner}/{parsed.repo}/{parsed.branch}/{parsed.file_path}"
+    def build_raw_url(self, parsed: ParsedGitHubURL, ref: Optional[str] = None) -> str:
+        return f"{self.raw_base_url}/{parsed.owner}/{parsed.repo}/{ref or parsed.branch}/{parsed.file_path}"
 
-    def fetch_file_content(self, parsed: ParsedGitHubURL) -> str:
-        raw_url = self.build_raw_url(parsed)
-        resp = requests.get(raw_url, timeout=10)
+    def git_host(self) -> str:
+        return urlparse(self.git_base_url).netloc
+
+    def start_cycle(self) -> None:
+        pass
+
+    def changed_paths(self, owner: str, repo: str, old: str, new: str) -> Optional[Set[str]]:
+        # Unknown over plain HTTP; the files are read and compared instead.
+        return None
+
+    def prefetch(self, requests: List[FileRequest]) -> None:
+        pass
+
+    def resolve_head(self, owner: str, repo: str, branch: str) -> Optional[str]:
+        if COMMIT_SHA_RE.fullmatch(branch):
+            return branch
+
+        refs = self._ls_refs_v2(owner, repo, branch)
+        if not refs:
+            refs = self._ls_refs_v0(owner, repo)
+        for ref_name in (f"refs/heads/{branch}", f"refs/tags/{branch}"):
+            if ref_name in refs:
+                return refs[ref_name]
+        return None
+
+    def _ls_refs_v2(self, owner: str, repo: str, branch: str) -> Dict[str, str]:
+        url = f"{self.git_base_url}/{owner}/{repo}.git/git-upload-pack"
+        body = (
+            pkt_line("command=ls-refs\n")
+            + b"0001"
+            + pkt_line(f"ref-prefix refs/heads/{branch}\n")
+            + pkt_line(f"ref-prefix refs/tags/{branch}\n")
+            + b"0000"
+        )
+        headers = {
+            "Content-Type": "application/x-git-upload-pack-request",
+            "Accept": "application/x-git-upload-pack-result",
+            "Git-Protocol": "version=2",
+        }
+        try:
+            resp = self._request("POST", url, data=body, headers=headers)
+            if resp.status_code != 200:
+                return {}
+            return self._parse_ref_lines(parse_pkt_lines(resp.content))
+        except ValueError:
+            return {}
+
+    def _ls_refs_v0(self, owner: str, repo: str) -> Dict[str, str]:
+        url = f"{self.git_base_url}/{owner}/{repo}.git/info/refs?service=git-upload-pack"
+        resp = self._request("GET", url)
         resp.raise_for_status()
-        return resp.text
+        return self._parse_ref_lines(parse_pkt_lines(resp.content))
+
+    def _parse_ref_lines(self, lines: List[bytes]) -> Dict[str, str]:
+        refs: Dict[str, str] = {}
+        for raw in lines:
+            line = raw.split(b"\0", 1)[0].decode("utf-8", "replace").strip()
+            if line.startswith("#"):
+                continue
+            parts = line.split(" ")
+            if len(parts) < 2 or not COMMIT_SHA_RE.fullmatch(parts[0]):
+                raise ValueError(f"Unexpected ref advertisement line: {line[:80]}")
+            refs[parts[1]] = parts[0]
+        return refs
+
+    def host_for(self, parsed: ParsedGitHubURL) -> str:
+        return urlparse(self.build_raw_url(parsed)).netloc
+
+    def fetch_file_content(self, parsed: ParsedGitHubURL) -> str:
+        return self.fetch_file(parsed).content
+
+    def fetch_file(
+        self,
+        parsed: ParsedGitHubURL,
+        ref: Optional[str] = None,
+        max_line: Optional[int] = None,
+    ) -> FileFetch:
+        # Cache entries are keyed by the branch URL even when the request is
+        # pinned to a commit, so content-derived ETags still yield 304s.
+        cache_key = self.build_raw_url(parsed)
+        raw_url = self.build_raw_url(parsed, ref)
+        cached = self.cache.get(cache_key) if self.cache else None
+
+        headers = {}
+        resume = False
+        if cached and self._covers(cached, max_line):
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified and raw_url == cache_key:
+                headers["If-Modified-Since"] = cached.last_modified
+        elif cached and cached.etag and cached.size:
+            # The cached prefix is too short: ask for the rest of the same
+            # version only, and fall back to a full read if it changed.
+            headers["Range"] = f"bytes={cached.size}-"
+            headers["If-Range"] = cached.etag
+            resume = True
+        if max_line is not None or resume:
+            # Cut points and resume offsets count bytes of the plain body, which
+            # only match the wire when it is not gzip-encoded.
+            headers["Accept-Encoding"] = "identity"
+
+        resp = self._request("GET", raw_url, headers=headers, stream=True)
+        if resume and resp.status_code == 206 and _encoded(resp):
+            # The origin encoded the range anyway; it cannot be appended to the plain prefix.
+            resp.close()
+            resume = False
+            del headers["Range"], headers["If-Range"]
+            resp = self._request("GET", raw_url, headers=headers, stream=True)
+        try:
+            if cached and resp.status_code == 304:
+                return FileFetch(content=cached.body, etag=cached.validator, not_modified=True)
+            resp.raise_for_status()
+
+            if resume and resp.status_code == 206:
+                prefix = cached.body.encode("utf-8")
+                data, complete = self._read_lines(resp, max_line, prefix)
+                entry = CachedResponse(
+                    url=cache_key,
+                    etag=cached.etag,
+                    last_modified=cached.last_modified,
+                    body=prefix.decode("utf-8") + data[len(prefix) :].decode(resp.encoding or "utf-8", "replace"),
+                    complete=complete,
+                    size=len(data),
+                )
+                not_modified = True
+            else:
+                data, complete = self._read_lines(resp, max_line)
+                entry = CachedResponse(
+                    url=cache_key,
+                    etag=resp.headers.get("ETag", ""),
+                    last_modified=resp.headers.get("Last-Modified", ""),
+                    body=data.decode(resp.encoding or "utf-8", "replace"),
+                    complete=complete,
+                    size=len(data),
+                )
+                not_modified = False
+        finally:
+            resp.close()
+
+        if self.cache and entry.validator:
+            self.cache.put(entry)
+        return FileFetch(content=entry.body, etag=entry.validator, not_modified=not_modified)
+
+    def _covers(self, cached: CachedResponse, max_line: Optional[int]) -> bool:
+        if cached.complete:
+            return True
+        return max_line is not None and cached.body.count("\n") >= max_line
+
+    def _read_lines(self, resp, max_line: Optional[int], prefix: bytes = b"") -> Tuple[bytes, bool]:
+        # An encoded body is always read whole, so its cache entry never needs resuming.
+        if _encoded(resp) or 0 < int(resp.headers.get("Content-Length") or 0) <= FULL_READ_LIMIT:
+            max_line = None
+        buf = bytearray(prefix)
+        newlines = prefix.count(b"\n")
+        for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if max_line is not None:
+                needed = max_line - newlines
+                count = chunk.count(b"\n")
+                if count >= needed:
+                    cut = -1
+                    for _ in range(needed):
+                        cut = chunk.index(b"\n", cut + 1)
+                    buf += chunk[: cut + 1]
+                    return bytes(buf), False
+                newlines += count
+            buf += chunk
+        return bytes(buf), True
 
     def extract_lines(self, content: str, start_line: int, end_line: int) -> str:
-        lines = content.splitlines()
+        return self.extract_line_range(content.splitlines(), start_line, end_line)
+
+    def extract_line_range(self, lines: List[str], start_line: int, end_line: int) -> str:
         if start_line < 1 or end_line > len(lines):
             raise ValueError("Requested lines are out of range of the file")
         snippet_lines = lines[start_line - 1 : end_line]
@@ -0,0 +1,175 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from github_client import MAX_PACE_WAIT, FileFetch, FileRequest, GitHubClient, ParsedGitHubURL
+from http_cache import ResponseCache
+from ratelimit import RequestBudget
+from tracing import span
+from transport import HttpTransport
+
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Lookups per query. GitHub charges about one point per query of this shape,
+# but very wide queries are slow to resolve and easy to time out.
+OID_CHUNK = 100
+# Blob text queries are also bounded by the bytes they return.
+TEXT_CHUNK = 40
+TEXT_CHUNK_BYTES = 2 * 1024 * 1024
+# Larger blobs come back truncated, so they are read over raw HTTP instead.
+MAX_TEXT_BYTES = 512 * 1024
+
+_FileKey = Tuple[str, str, str, str]
+
+
+class GraphQLError(Exception):
+    pass
+
+
+def blob_etag(oid: str) -> str:
+    return f'"{oid}"'
+
+
+class GraphQLClient(GitHubClient):
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        transport: Optional[HttpTransport] = None,
+        git_base_url: Optional[str] = None,
+        token: Optional[str] = None,
+        budget: Optional[RequestBudget] = None,
+        graphql_url: Optional[str] = None,
+        raw_base_url: Optional[str] = None,
+    ):
+        super().__init__(
+            cache=cache,
+            transport=transport,
+            git_base_url=git_base_url,
+            token=token,
+            budget=budget,
+            raw_base_url=raw_base_url,
+        )
+        self.graphql_url = graphql_url or GITHUB_GRAPHQL_URL
+        # GraphQL has its own point budget, separate from the REST limit.
+        self.graphql_budget = RequestBudget()
+        self._prefetched: Dict[_FileKey, FileFetch] = {}
+        self._lock = threading.Lock()
+
+    def start_cycle(self) -> None:
+        with self._lock:
+            self._prefetched.clear()
+
+    def _file_key(self, parsed: ParsedGitHubURL, ref: Optional[str]) -> _FileKey:
+        return parsed.owner, parsed.repo, ref or parsed.branch, parsed.file_path
+
+    def prefetch(self, requests: List[FileRequest]) -> None:
+        if not requests:
+            return
+        try:
+            wanted: List[Tuple[FileRequest, int]] = []
+            for start in range(0, len(requests), OID_CHUNK):
+                chunk = requests[start : start + OID_CHUNK]
+                for request, blob in zip(chunk, self._lookup(chunk, with_text=False)):
+                    if blob is None or blob.get("isBinary") or int(blob.get("byteSize") or 0) > MAX_TEXT_BYTES:
+                        continue
+                    if request.known_etag == blob_etag(blob["oid"]):
+                        self._store(request, FileFetch(content="", etag=request.known_etag, not_modified=True))
+                    else:
+                        wanted.append((request, int(blob.get("byteSize") or 0)))
+
+            for chunk in self._text_chunks(wanted):
+                for request, blob in zip(chunk, self._lookup(chunk, with_text=True)):
+                    if blob is not None and blob.get("text") is not None and not blob.get("isTruncated"):
+                        self._store(request, FileFetch(content=blob["text"], etag=blob_etag(blob["oid"])))
+        except Exception as e:
+            # Whatever was not prefetched is read over raw HTTP instead.
+            print(f"GraphQL prefetch failed, falling back to raw requests: {e}")
+
+    def _store(self, request: FileRequest, fetch: FileFetch) -> None:
+        with self._lock:
+            self._prefetched[self._file_key(request.parsed, request.ref)] = fetch
+
+    def _text_chunks(self, wanted: List[Tuple[FileRequest, int]]) -> List[List[FileRequest]]:
+        chunks: List[List[FileRequest]] = []
+        current: List[FileRequest] = []
+        total = 0
+        for request, size in wanted:
+            if current and (len(current) >= TEXT_CHUNK or total + size > TEXT_CHUNK_BYTES):
+                chunks.append(current)
+                current, total = [], 0
+            current.append(request)
+            total += size
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _lookup(self, requests: List[FileRequest], with_text: bool) -> List[Optional[Dict[str, Any]]]:
+        query, variables, aliases = self._build_query(requests, with_text)
+        data = self._post(query, variables)
+        blobs: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        for (repo_alias, file_alias), index in aliases.items():
+            blob = (data.get(repo_alias) or {}).get(file_alias)
+            if blob and blob.get("oid"):
+                blobs[index] = blob
+        return blobs
+
+    def _build_query(
+        self,
+        requests: List[FileRequest],
+        with_text: bool,
+    ) -> Tuple[str, Dict[str, str], Dict[Tuple[str, str], int]]:
+        # Files of one repository share a repository() selection; every value
+        # goes through a variable so paths never need escaping.
+        fields = "oid text isTruncated" if with_text else "oid byteSize isBinary"
+        repos: Dict[Tuple[str, str], List[int]] = {}
+        for index, request in enumerate(requests):
+            repos.setdefault((request.parsed.owner, request.parsed.repo), []).append(index)
+
+        params: List[str] = []
+        selections: List[str] = []
+        variables: Dict[str, str] = {}
+        aliases: Dict[Tuple[str, str], int] = {}
+        for r, ((owner, name), indices) in enumerate(repos.items()):
+            params += [f"$o{r}: String!", f"$n{r}: String!"]
+            variables[f"o{r}"] = owner
+            variables[f"n{r}"] = name
+            objects = []
+            for index in indices:
+                request = requests[index]
+                params.append(f"$e{index}: String!")
+                variables[f"e{index}"] = f"{request.ref or request.parsed.branch}:{request.parsed.file_path}"
+                objects.append(f"f{index}: object(expression: $e{index}) {{ ... on Blob {{ {fields} }} }}")
+                aliases[(f"r{r}", f"f{index}")] = index
+            selections.append(f"r{r}: repository(owner: $o{r}, name: $n{r}) {{ {' '.join(objects)} }}")
+        query = f"query({', '.join(params)}) {{ {' '.join(selections)} }}"
+        return query, variables, aliases
+
+    def _post(self, query: str, variables: Dict[str, str]) -> Dict[str, Any]:
+        self.graphql_budget.pace(MAX_PACE_WAIT)
+        with span("github.graphql", lookups=sum(1 for name in variables if name.startswith("e"))) as attrs:
+            resp = self.transport.post(
+                self.graphql_url,
+                json={"query": query, "variables": variables},
+                headers=self._auth_headers(self.graphql_url),
+            )
+            attrs["status"] = resp.status_code
+        body = resp.text if resp.status_code in (403, 429) else ""
+        self.graphql_budget.observe(resp.status_code, resp.headers, body)
+        resp.raise_for_status()
+        payload = resp.json()
+        data = payload.get("data")
+        if data is None:
+            raise GraphQLError("; ".join(e.get("message", "") for e in payload.get("errors") or []) or "no data")
+        # Missing files or repositories come back as per-field errors next to partial data.
+        return data
+
+    def fetch_file(
+        self,
+        parsed: ParsedGitHubURL,
+        ref: Optional[str] = None,
+        max_line: Optional[int] = None,
+    ) -> FileFetch:
+        with self._lock:
+            fetch = self._prefetched.pop(self._file_key(parsed, ref), None)
+        if fetch is not None:
+            return fetch
+        return super().fetch_file(parsed, ref=ref, max_line=max_line)
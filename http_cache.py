@@ -0,0 +1,52 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+
+@dataclass(slots=True)
+class CachedResponse:
+    url: str
+    etag: str = ""
+    last_modified: str = ""
+    body: str = ""
+    # A streamed fetch may stop after the last watched line; size is then the
+    # byte offset where the cached prefix ends and a Range request resumes.
+    complete: bool = True
+    size: int = 0
+
+    @property
+    def validator(self) -> str:
+        return self.etag or self.last_modified
+
+
+class ResponseCache:
+    def __init__(self, directory: str = ".echelon_cache/http"):
+        self.directory = directory
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = CachedResponse(**data)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Ignoring unreadable cache entry for {url}: {e}")
+            return None
+        return entry if entry.url == url else None
+
+    def put(self, entry: CachedResponse) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(entry.url)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(entry), f)
+        os.replace(tmp_path, path)
+
@@ -0,0 +1,260 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> _LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[_LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[_LabelValues, float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: object) -> Optional[float]:
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (not cumulative), sum, count.
+        self._series: Dict[_LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0.0]))
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return int(series[1][1]) if series else 0
+
+    def series(self) -> Dict[_LabelValues, Tuple[List[int], float, int]]:
+        # Per label set: observations per bucket (the last one is +Inf), sum and count.
+        with self._lock:
+            return {key: (list(counts), totals[0], int(totals[1])) for key, (counts, totals) in self._series.items()}
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), list(totals))) for key, (counts, totals) in self._series.items())
+        lines: List[str] = []
+        for key, (counts, (total, count)) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(count)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "echelon_stage_seconds", "Time spent handling one batch in a pipeline stage.", ["stage"]
+)
+STAGE_ITEMS = REGISTRY.counter("echelon_stage_items_total", "Items handled by a pipeline stage.", ["stage"])
+STAGE_ERRORS = REGISTRY.counter(
+    "echelon_stage_errors_total", "Pipeline stage batches that failed or timed out.", ["stage", "kind"]
+)
+EXTRACT_SECONDS = REGISTRY.histogram(
+    "echelon_extract_seconds", "Time spent extracting (and relocating) one snippet from its file."
+)
+HTTP_REQUESTS = REGISTRY.counter("echelon_http_requests_total", "HTTP requests by host and status.", ["host", "status"])
+HTTP_SECONDS = REGISTRY.histogram(
+    "echelon_http_request_seconds", "HTTP request latency until response headers, by host.", ["host"]
+)
+GIT_SECONDS = REGISTRY.histogram(
+    "echelon_git_command_seconds", "Duration of git commands run by the mirror backend.", ["command"]
+)
+FILE_CHECKS = REGISTRY.counter(
+    "echelon_file_checks_total",
+    "Watched files per cycle by outcome: fetched, not_modified, head_unchanged, untouched or failed.",
+    ["result"],
+)
+RATE_LIMIT_HITS = REGISTRY.counter(
+    "echelon_rate_limit_hits_total", "Responses that asked Echelon to slow down, by service.", ["service"]
+)
+SUMMARY_SECONDS = REGISTRY.histogram(
+    "echelon_summary_seconds", "Latency of one summary batch by AI provider.", ["provider"]
+)
+SUMMARY_ERRORS = REGISTRY.counter("echelon_summary_errors_total", "Failed summary batches by AI provider.", ["provider"])
+NOTIFY_SECONDS = REGISTRY.histogram(
+    "echelon_notify_seconds", "Time for a channel to accept a notification.", ["channel"]
+)
+NOTIFICATIONS = REGISTRY.counter(
+    "echelon_notifications_total", "Notifications handed to a channel by result.", ["channel", "result"]
+)
+DELIVERIES = REGISTRY.counter(
+    "echelon_deliveries_total", "Outbox send attempts by channel and result.", ["channel", "result"]
+)
+OUTBOX_PENDING = REGISTRY.gauge("echelon_outbox_pending", "Messages waiting in the outbox by channel.", ["channel"])
+SNIPPET_RESULTS = REGISTRY.counter(
+    "echelon_snippet_results_total", "Snippet polls by result: changed, formatting_only, failed or deferred.", ["result"]
+)
+CYCLES = REGISTRY.counter("echelon_cycles_total", "Completed monitoring cycles.")
+CYCLE_SECONDS = REGISTRY.gauge("echelon_cycle_duration_seconds", "Duration of the last monitoring cycle.")
+SCHEDULE_LAG = REGISTRY.gauge(
+    "echelon_schedule_lag_seconds", "How far behind its due time the most overdue snippet of the last cycle was."
+)
+LAST_CYCLE = REGISTRY.gauge("echelon_last_cycle_timestamp_seconds", "Unix time the last cycle finished.")
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
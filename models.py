@@ -1,8 +1,11 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from typing import List, Dict, Any, Optional
 
+# Runtime fields persisted in the SQLite state store rather than config.json.
+SNIPPET_STATE_FIELDS = ("original_digest", "last_seen_digest", "last_seen_fingerprint", "last_seen_etag", "head_sha")
 
-@dataclass
+
+@dataclass(slots=True)
 class SnippetConfig:
     id: str
     owner: str
@@ -13,22 +16,71 @@ class SnippetConfig:
     end_line: int
     file_url: str
     note: str = ""
-    original_code: str = ""
-    last_seen_code: str = ""
+    anchored: bool = False
+    channels: List[str] = field(default_factory=list)
+    min_interval: int = 0
+    max_interval: int = 0
+    priority: str = "normal"
+    normalize: str = ""
+    original_digest: str = ""
+    last_seen_digest: str = ""
+    last_seen_fingerprint: str = ""
+    last_seen_etag: str = ""
+    head_sha: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in asdict(self).items() if k not in SNIPPET_STATE_FIELDS}
+
+
+@dataclass(slots=True)
+class ChangeNotice:
+    snippet: SnippetConfig
+    diff_text: str
+    diff_summary: Optional[str] = None
+    diff_source: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class AppConfig:
     webhook_url: str = ""
     telegram_bot_token: str = ""
     telegram_chat_id: str = ""
+    telegram_api_base: str = ""
+    github_token: str = ""
     interval_seconds: int = 300
+    min_interval_seconds: int = 0
+    max_interval_seconds: int = 0
+    schedule_jitter: float = 0.1
     ollama_endpoint: str = ""
     ollama_model: str = ""
     gemini_api_key: str = ""
     gemini_model: str = ""
+    gemini_endpoint: str = ""
     openai_key: str = ""
     openai_model: str = ""
+    openai_endpoint: str = ""
+    cache_dir: str = ".echelon_cache"
+    fetch_backend: str = "http"
+    raw_base_url: str = ""
+    git_base_url: str = ""
+    graphql_url: str = ""
+    diff_engine: str = "auto"
+    fetch_workers: int = 8
+    fetch_per_host: int = 4
+    http_pool_size: int = 10
+    http_retries: int = 2
+    http_timeout: int = 10
+    ai_cache_max_entries: int = 2000
+    ai_cache_ttl_seconds: int = 30 * 24 * 3600
+    pipeline_queue_size: int = 64
+    summary_workers: int = 2
+    notify_workers: int = 2
+    fetch_timeout_seconds: int = 60
+    diff_timeout_seconds: int = 30
+    summary_timeout_seconds: int = 120
+    notify_timeout_seconds: int = 30
+    digest_window_seconds: int = 0
+    metrics_port: int = 0
     snippets: List[SnippetConfig] = None
 
     def to_dict(self) -> Dict[str, Any]:
@@ -36,14 +88,43 @@ class AppConfig:
             "webhook_url": self.webhook_url,
             "telegram_bot_token": self.telegram_bot_token,
             "telegram_chat_id": self.telegram_chat_id,
+            "telegram_api_base": self.telegram_api_base,
+            "github_token": self.github_token,
             "interval_seconds": self.interval_seconds,
+            "min_interval_seconds": self.min_interval_seconds,
+            "max_interval_seconds": self.max_interval_seconds,
+            "schedule_jitter": self.schedule_jitter,
             "ollama_endpoint": self.ollama_endpoint,
             "ollama_model": self.ollama_model,
             "gemini_api_key": self.gemini_api_key,
             "gemini_model": self.gemini_model,
+            "gemini_endpoint": self.gemini_endpoint,
             "openai_key": self.openai_key,
             "openai_model": self.openai_model,
-            "snippets": [asdict(s) for s in (self.snippets or [])],
+            "openai_endpoint": self.openai_endpoint,
+            "cache_dir": self.cache_dir,
+            "fetch_backend": self.fetch_backend,
+            "raw_base_url": self.raw_base_url,
+            "git_base_url": self.git_base_url,
+            "graphql_url": self.graphql_url,
+            "diff_engine": self.diff_engine,
+            "fetch_workers": self.fetch_workers,
+            "fetch_per_host": self.fetch_per_host,
+            "http_pool_size": self.http_pool_size,
+            "http_retries": self.http_retries,
+            "http_timeout": self.http_timeout,
+            "ai_cache_max_entries": self.ai_cache_max_entries,
+            "ai_cache_ttl_seconds": self.ai_cache_ttl_seconds,
+            "pipeline_queue_size": self.pipeline_queue_size,
+            "summary_workers": self.summary_workers,
+            "notify_workers": self.notify_workers,
+            "fetch_timeout_seconds": self.fetch_timeout_seconds,
+            "diff_timeout_seconds": self.diff_timeout_seconds,
+            "summary_timeout_seconds": self.summary_timeout_seconds,
+            "notify_timeout_seconds": self.notify_timeout_seconds,
+            "digest_window_seconds": self.digest_window_seconds,
+            "metrics_port": self.metrics_port,
+            "snippets": [s.to_dict() for s in (self.snippets or [])],
         }
 
     @staticmethod
@@ -62,21 +143,58 @@ class AppConfig:
                     end_line=s["end_line"],
                     file_url=s["file_url"],
                     note=s.get("note", ""),
-                    original_code=s.get("original_code", ""),
-                    last_seen_code=s.get("last_seen_code", ""),
+                    anchored=bool(s.get("anchored", False)),
+                    channels=list(s.get("channels") or []),
+                    min_interval=int(s.get("min_interval", 0) or 0),
+                    max_interval=int(s.get("max_interval", 0) or 0),
+                    priority=s.get("priority", "normal") or "normal",
+                    normalize=s.get("normalize", "") or "",
+                    original_digest=s.get("original_digest", ""),
+                    last_seen_digest=s.get("last_seen_digest", ""),
+                    last_seen_etag=s.get("last_seen_etag", ""),
+                    head_sha=s.get("head_sha", ""),
                 )
             )
         return AppConfig(
             webhook_url=data.get("webhook_url", ""),
             telegram_bot_token=data.get("telegram_bot_token", ""),
             telegram_chat_id=str(data.get("telegram_chat_id", "") or ""),
+            telegram_api_base=data.get("telegram_api_base", ""),
+            github_token=data.get("github_token", ""),
             interval_seconds=data.get("interval_seconds", 300),
+            min_interval_seconds=data.get("min_interval_seconds", 0),
+            max_interval_seconds=data.get("max_interval_seconds", 0),
+            schedule_jitter=data.get("schedule_jitter", 0.1),
             ollama_endpoint=data.get("ollama_endpoint", ""),
             ollama_model=data.get("ollama_model", ""),
             gemini_api_key=data.get("gemini_api_key", ""),
             gemini_model=data.get("gemini_model", ""),
+            gemini_endpoint=data.get("gemini_endpoint", ""),
             openai_key=data.get("openai_key", ""),
             openai_model=data.get("openai_model", ""),
+            openai_endpoint=data.get("openai_endpoint", ""),
+            cache_dir=data.get("cache_dir", ".echelon_cache"),
+            fetch_backend=data.get("fetch_backend", "http"),
+            raw_base_url=data.get("raw_base_url", ""),
+            git_base_url=data.get("git_base_url", ""),
+            graphql_url=data.get("graphql_url", ""),
+            diff_engine=data.get("diff_engine", "auto"),
+            fetch_workers=data.get("fetch_workers", 8),
+            fetch_per_host=data.get("fetch_per_host", 4),
+            http_pool_size=data.get("http_pool_size", 10),
+            http_retries=data.get("http_retries", 2),
+            http_timeout=data.get("http_timeout", 10),
+            ai_cache_max_entries=data.get("ai_cache_max_entries", 2000),
+            ai_cache_ttl_seconds=data.get("ai_cache_ttl_seconds", 30 * 24 * 3600),
+            pipeline_queue_size=data.get("pipeline_queue_size", 64),
+            summary_workers=data.get("summary_workers", 2),
+            notify_workers=data.get("notify_workers", 2),
+            fetch_timeout_seconds=data.get("fetch_timeout_seconds", 60),
+            diff_timeout_seconds=data.get("diff_timeout_seconds", 30),
+            summary_timeout_seconds=data.get("summary_timeout_seconds", 120),
+            notify_timeout_seconds=data.get("notify_timeout_seconds", 30),
+            digest_window_seconds=data.get("digest_window_seconds", 0),
+            metrics_port=data.get("metrics_port", 0),
             snippets=snippets,
         )
 
@@ -1,18 +1,94 @@
+import os
 import time
-import hashlib
-import difflib
-from typing import Optional, Protocol
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Protocol, Set, Tuple
+
+from ai_batch import PROMPT_VERSION, DiffRequest
 
 from config_manager import ConfigManager
-from github_client import GitHubClient
+from diff_engine import DIFF_ENGINES, DiffEngine, build_diff
+from fetcher import ConcurrentFetcher
+from github_client import FileFetch, FileRequest, GitHubClient, ParsedGitHubURL
 from ollama_client import OllamaClient
 from gemini_client import GeminiClient
+from metrics import (
+    CYCLE_SECONDS,
+    CYCLES,
+    EXTRACT_SECONDS,
+    FILE_CHECKS,
+    LAST_CYCLE,
+    SCHEDULE_LAG,
+    SNIPPET_RESULTS,
+    STAGE_SECONDS,
+    SUMMARY_ERRORS,
+    SUMMARY_SECONDS,
+)
 from openai_client import OpenAIClient
-from models import SnippetConfig
+from models import AppConfig, ChangeNotice, SnippetConfig
+from normalize import fingerprint
+from pipeline import Pipeline, Stage, committing
+from profiling import SamplingProfiler
+from relocate import find_snippet
+from state_store import content_digest
+from ratelimit import PRIORITIES, RateLimitedError
+from scheduler import CycleReport, PollScheduler, budget_pressure
+from summary_cache import CachedSummarizer, SummaryCache, Summarizer
+from tracing import span, start_trace, stop_trace
+from transport import HttpTransport, default_transport
+
+# Diffs reaching the summarize stage within the linger window share one LLM request.
+SUMMARY_BATCH_SIZE = 20
+SUMMARY_BATCH_LINGER = 0.25
+
+# Extra time the notify stage allows beyond the router's own channel timeout.
+NOTIFY_STAGE_GRACE_SECONDS = 10
+
+# Longest the daemon sleeps between looking at config.json and the schedule.
+CONFIG_RECHECK_SECONDS = 30
+
+
+@dataclass(slots=True)
+class DetectedChange:
+    snippet: SnippetConfig
+    diff_text: str
+    new_code: str
+    new_digest: str
+    new_fingerprint: str = ""
+    etag: str = ""
+    head: Optional[str] = None
+    summary: Optional[str] = None
+
+
+@dataclass(slots=True)
+class _CycleState:
+    committed: int = 0
+    relocated: bool = False
+    report: CycleReport = field(default_factory=CycleReport)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_committed(self) -> None:
+        with self.lock:
+            self.committed += 1
+
+    def mark_changed(self, snippet_id: str) -> None:
+        with self.lock:
+            self.report.changed.add(snippet_id)
+
+    def mark_failed(self, snippet_id: str) -> None:
+        with self.lock:
+            self.report.failed.add(snippet_id)
 
+    def mark_deferred(self, snippet_id: str) -> None:
+        with self.lock:
+            self.report.deferred.add(snippet_id)
 
-def hash_str(s: str) -> str:
-    return hashlib.sha256((s or "").encode("utf-8")).hexdigest()[:10]
+    def mark_relocated(self) -> None:
+        with self.lock:
+            self.relocated = True
+
+
+_FileJob = Tuple[List[Tuple[SnippetConfig, ParsedGitHubURL]], Optional[str]]
 
 
 class Notifier(Protocol):
@@ -22,7 +98,11 @@ class Notifier(Protocol):
         diff_text: str,
         diff_summary: Optional[str] = None,
         diff_source: Optional[str] = None,
-    ) -> None: ...
+    ) -> Optional[bool]: ...
+
+
+class DigestNotifier(Notifier, Protocol):
+    def notify_digest(self, notices: List[ChangeNotice]) -> Optional[bool]: ...
 
 
 class SnippetMonitor:
@@ -34,6 +114,11 @@ class SnippetMonitor:
         debug: bool = False,
         provider: Optional[str] = None,
         model: Optional[str] = None,
+        transport: Optional[HttpTransport] = None,
+        digest: bool = False,
+        trace_dir: Optional[str] = None,
+        trace_format: str = "jsonl",
+        profile_dir: Optional[str] = None,
     ):
         self.config_manager = config_manager
         self.github_client = github_client
@@ -41,126 +126,587 @@ class SnippetMonitor:
         self.debug = debug
         self.provider = provider
         self.model = model
+        self.transport = transport or default_transport()
+        self._summarizer_key: Optional[Tuple[str, ...]] = None
+        self._summarizer: Optional[Summarizer] = None
+        self._diff_source: Optional[str] = None
+        self._summary_cache: Optional[SummaryCache] = None
+        self.digest = digest
+        self._digest_lock = threading.Lock()
+        self._digest_pending: Dict[str, Tuple[DetectedChange, ChangeNotice]] = {}
+        self._digest_since: Optional[float] = None
+        self.trace_dir = trace_dir
+        self.trace_format = trace_format
+        self.profile_dir = profile_dir
 
     def run_forever(self) -> None:
+        scheduler = PollScheduler()
         while True:
+            due: Set[str] = set()
+            config: Optional[AppConfig] = None
             try:
-                self.run_once()
+                config = self.config_manager.load()
+                now = time.time()
+                scheduler.sync(config, now)
+                due = scheduler.pop_due(now)
+                if due:
+                    SCHEDULE_LAG.set(scheduler.lag(due, now))
+                    report = self.run_once([s for s in config.snippets or [] if s.id in due])
+                    budget = self.github_client.budget.snapshot()
+                    if self.debug and budget.remaining is not None:
+                        print(f"[DEBUG] GitHub request budget: {budget.remaining}/{budget.limit}")
+                    scheduler.record(config, due, report, time.time(), budget_pressure(budget.fraction))
             except KeyboardInterrupt:
                 print("Monitoring interrupted by user.")
                 break
             except Exception as e:
                 print(f"Unexpected error during monitoring loop: {e}")
-            config = self.config_manager.load()
-            interval = max(5, config.interval_seconds or 300)
-            print(f"Sleeping for {interval} seconds...")
-            time.sleep(interval)
+                if config is not None:
+                    scheduler.record(config, due, CycleReport(failed=set(due)), time.time())
+
+            next_due = scheduler.next_due()
+            # Wake up regularly anyway so snippets added to config.json are picked up.
+            wait = CONFIG_RECHECK_SECONDS if next_due is None else min(CONFIG_RECHECK_SECONDS, next_due - time.time())
+            if wait > 0:
+                if self.debug and next_due is not None:
+                    print(f"[DEBUG] Next snippet due in {max(0.0, next_due - time.time()):.0f} seconds")
+                time.sleep(wait)
 
-    def run_once(self) -> None:
+    def run_once(self, snippets: Optional[List[SnippetConfig]] = None) -> CycleReport:
         config = self.config_manager.load()
         if not config.snippets:
             print("No snippets configured; nothing to monitor.")
-            return
+            return CycleReport()
+        if snippets is None:
+            snippets = config.snippets
+
+        tracer = start_trace() if self.trace_dir else None
+        profiler = SamplingProfiler() if self.profile_dir else None
+        if profiler is not None:
+            profiler.start()
+        try:
+            with span("cycle", snippets=len(snippets)) as attrs:
+                report = self._run_cycle(config, snippets)
+                attrs.update(changed=len(report.changed), failed=len(report.failed), deferred=len(report.deferred))
+            return report
+        finally:
+            if profiler is not None:
+                profiler.stop()
+                # Sharing the trace's id pairs a cycle's profile with its trace.
+                path = profiler.write(self.profile_dir, run_id=tracer.trace_id if tracer is not None else None)
+                print(f"Profile of {profiler.samples} samples written to {path}")
+            if tracer is not None:
+                stop_trace(tracer)
+                print(f"Trace written to {tracer.write(self.trace_dir, self.trace_format)}")
+
+    def _run_cycle(self, config: AppConfig, snippets: List[SnippetConfig]) -> CycleReport:
+        started = time.perf_counter()
+        summarizer, diff_source = self._get_summarizer(config)
+        diff_engine = DIFF_ENGINES.get(config.diff_engine, DIFF_ENGINES["auto"])
+        self.github_client.start_cycle()
+
+        groups: Dict[Tuple[str, str, str, str], List[Tuple[SnippetConfig, ParsedGitHubURL]]] = {}
+        cycle = _CycleState()
+        for snippet in snippets:
+            try:
+                parsed = self.github_client.parse_github_url(snippet.file_url)
+            except Exception as e:
+                print(f"Error while checking snippet {snippet.file_url}: {e}")
+                cycle.mark_failed(snippet.id)
+                continue
+            key = (parsed.owner, parsed.repo, parsed.branch, parsed.file_path)
+            groups.setdefault(key, []).append((snippet, parsed))
+
+        if self.debug:
+            print(f"[DEBUG] {len(snippets)} snippets across {len(groups)} files")
+
+        groups = self._admit_groups(groups, cycle)
+        fetcher = ConcurrentFetcher(config.fetch_workers, config.fetch_per_host)
+        with STAGE_SECONDS.time(stage="resolve"), span("resolve_heads", repos=len({k[:3] for k in groups})):
+            heads = self._resolve_heads(fetcher, groups)
+
+        def fetch_stage(batch: List[_FileJob]) -> List[Tuple[_FileJob, FileFetch]]:
+            entries, head = batch[0]
+            parsed = entries[0][1]
+            with fetcher.host_slot(self.github_client.host_for(parsed)), span(
+                "fetch", file=parsed.file_url.split("#", 1)[0], snippets=len(entries)
+            ) as attrs:
+                fetch = self.github_client.fetch_file(parsed, ref=head, max_line=self._max_line(entries))
+                attrs["not_modified"] = fetch.not_modified
+            FILE_CHECKS.inc(result="not_modified" if fetch.not_modified else "fetched")
+            return [(batch[0], fetch)]
+
+        def fetch_failed(batch: List[_FileJob], error: Exception) -> None:
+            FILE_CHECKS.inc(result="failed")
+            for snippet, _ in batch[0][0]:
+                if isinstance(error, RateLimitedError):
+                    print(f"Deferring {snippet.file_url}: {error}")
+                    cycle.mark_deferred(snippet.id)
+                    continue
+                print(f"Error while checking snippet {snippet.file_url}: {error}")
+                cycle.mark_failed(snippet.id)
+
+        def diff_stage(batch: List[Tuple[_FileJob, FileFetch]]) -> List[DetectedChange]:
+            (entries, head), fetch = batch[0]
+            return self._detect_changes(entries, head, fetch, cycle, diff_engine)
+
+        def summarize_stage(batch: List[DetectedChange]) -> List[DetectedChange]:
+            if summarizer:
+                with SUMMARY_SECONDS.time(provider=diff_source), span(
+                    "summarize", provider=diff_source, diffs=len(batch), snippets=[c.snippet.file_url for c in batch]
+                ):
+                    summaries = summarizer.summarize_diffs([DiffRequest(c.diff_text, c.snippet.note) for c in batch])
+                for change, summary in zip(batch, summaries):
+                    change.summary = summary
+            return batch
+
+        def summarize_failed(batch: List[DetectedChange], error: Exception) -> List[DetectedChange]:
+            # A missing summary should not hold back the notification itself.
+            SUMMARY_ERRORS.inc(provider=diff_source)
+            print(f"Error while summarizing {len(batch)} diffs: {error}")
+            return batch
+
+        def notify_stage(batch: List[DetectedChange]) -> None:
+            with committing(), span("deliver", snippet=batch[0].snippet.file_url, digest=self.digest):
+                if self.digest:
+                    self._hold_for_digest(batch[0], diff_source)
+                elif self._deliver(batch[0], diff_source):
+                    cycle.add_committed()
+
+        def notify_failed(batch: List[DetectedChange], error: Exception) -> None:
+            print(f"Error while delivering change for {batch[0].snippet.file_url}: {error}")
+
+        queue_size = config.pipeline_queue_size
+        stages = [
+            Stage(
+                "fetch",
+                fetch_stage,
+                workers=config.fetch_workers,
+                queue_size=queue_size,
+                timeout=config.fetch_timeout_seconds,
+                on_error=fetch_failed,
+            ),
+            Stage("diff", diff_stage, workers=2, queue_size=queue_size, timeout=config.diff_timeout_seconds),
+            Stage(
+                "summarize",
+                summarize_stage,
+                workers=config.summary_workers,
+                queue_size=queue_size,
+                timeout=config.summary_timeout_seconds,
+                batch_size=SUMMARY_BATCH_SIZE if summarizer else 1,
+                linger=SUMMARY_BATCH_LINGER if summarizer else 0.0,
+                on_error=summarize_failed,
+            ),
+            Stage(
+                "notify",
+                notify_stage,
+                workers=config.notify_workers,
+                queue_size=queue_size,
+                # The router gives up on channels after notify_timeout_seconds; the stage
+                # waits longer, so a send that is accepted is also committed.
+                timeout=config.notify_timeout_seconds + NOTIFY_STAGE_GRACE_SECONDS,
+                on_error=notify_failed,
+            ),
+        ]
+
+        jobs: List[_FileJob] = []
+        for key, entries in groups.items():
+            head = heads.get(key[:3])
+            if head and all(s.last_seen_digest and s.head_sha == head for s, _ in entries):
+                for snippet, _ in entries:
+                    print(f"No change in {snippet.file_url} (branch head unchanged)")
+                FILE_CHECKS.inc(result="head_unchanged")
+                continue
+            if head and self._untouched(key, entries, head, cycle):
+                FILE_CHECKS.inc(result="untouched")
+                continue
+            jobs.append((entries, head))
+
+        with STAGE_SECONDS.time(stage="prefetch"), span("prefetch", files=len(jobs)):
+            self.github_client.prefetch([self._file_request(entries, head) for entries, head in jobs])
+        with Pipeline(stages) as pipeline:
+            for job in jobs:
+                pipeline.submit(job)
+
+        if self.digest:
+            with span("deliver_digest"):
+                for _ in range(self._flush_digest(config.digest_window_seconds)):
+                    cycle.add_committed()
+
+        if cycle.relocated:
+            self.config_manager.save(config)
+        if cycle.committed:
+            self.config_manager.state.prune_blobs()
+
+        for result in ("changed", "failed", "deferred"):
+            SNIPPET_RESULTS.inc(len(getattr(cycle.report, result)), result=result)
+        CYCLES.inc()
+        CYCLE_SECONDS.set(time.perf_counter() - started)
+        LAST_CYCLE.set(time.time())
+        return cycle.report
+
+    def _detect_changes(
+        self,
+        entries: List[Tuple[SnippetConfig, ParsedGitHubURL]],
+        head: Optional[str],
+        fetch: FileFetch,
+        cycle: "_CycleState",
+        diff_engine: DiffEngine,
+    ) -> List[DetectedChange]:
+        changes: List[DetectedChange] = []
+        lines: Optional[List[str]] = None
+        for snippet, _ in entries:
+            # Baselines and versions are written here; a timed-out call stops before the next snippet.
+            with committing():
+                try:
+                    change: Optional[DetectedChange] = None
+                    dirty = False
+                    if fetch.etag and snippet.last_seen_etag == fetch.etag:
+                        if self.debug and fetch.not_modified:
+                            print(f"[DEBUG] 304 Not Modified for {snippet.file_url}")
+                        print(f"No change in {snippet.file_url}")
+                    else:
+                        if lines is None:
+                            lines = fetch.content.splitlines()
+                        with EXTRACT_SECONDS.time(), span("extract", snippet=snippet.file_url) as attrs:
+                            new_code, moved = self._extract(snippet, lines)
+                            attrs["relocated"] = moved
+                        if moved:
+                            cycle.mark_relocated()
+                        with span("diff", snippet=snippet.file_url) as attrs:
+                            change, dirty = self._check_snippet(snippet, new_code, diff_engine)
+                            attrs["changed"] = change is not None
+
+                    if change is not None:
+                        cycle.mark_changed(snippet.id)
+                        # Versions are recorded only once the change is delivered.
+                        change.etag = fetch.etag
+                        change.head = head
+                        changes.append(change)
+                        continue
+                    if self.digest:
+                        # The snippet is back to its baseline; drop any change still waiting for the digest.
+                        with self._digest_lock:
+                            self._digest_pending.pop(snippet.id, None)
+                    if self._apply_versions(snippet, fetch.etag, head) or dirty:
+                        self.config_manager.save_snippet_state(snippet)
+                        cycle.add_committed()
+                except Exception as e:
+                    print(f"Error while checking snippet {snippet.file_url}: {e}")
+                    cycle.mark_failed(snippet.id)
+        return changes
+
+    def _file_request(self, entries: List[Tuple[SnippetConfig, ParsedGitHubURL]], head: Optional[str]) -> FileRequest:
+        etags = {s.last_seen_etag if s.last_seen_digest else "" for s, _ in entries}
+        known = etags.pop() if len(etags) == 1 else ""
+        return FileRequest(parsed=entries[0][1], ref=head, known_etag=known)
+
+    def _untouched(
+        self,
+        key: Tuple[str, str, str, str],
+        entries: List[Tuple[SnippetConfig, ParsedGitHubURL]],
+        head: str,
+        cycle: "_CycleState",
+    ) -> bool:
+        old = entries[0][0].head_sha
+        if not old or any(not s.last_seen_digest or s.head_sha != old for s, _ in entries):
+            return False
+        owner, repo, _, file_path = key
+        changed = self.github_client.changed_paths(owner, repo, old, head)
+        if changed is None or file_path in changed:
+            return False
+
+        for snippet, _ in entries:
+            print(f"No change in {snippet.file_url} (file untouched since {old[:7]})")
+            if self._apply_versions(snippet, snippet.last_seen_etag, head):
+                self.config_manager.save_snippet_state(snippet)
+                cycle.add_committed()
+        return True
+
+    def _admit_groups(
+        self,
+        groups: Dict[Tuple[str, str, str, str], List[Tuple[SnippetConfig, ParsedGitHubURL]]],
+        cycle: _CycleState,
+    ) -> Dict[Tuple[str, str, str, str], List[Tuple[SnippetConfig, ParsedGitHubURL]]]:
+        budget = self.github_client.budget
+
+        def rank(entries: List[Tuple[SnippetConfig, ParsedGitHubURL]]) -> int:
+            return min(PRIORITIES.index(s.priority) if s.priority in PRIORITIES else 1 for s, _ in entries)
+
+        admitted: Dict[Tuple[str, str, str, str], List[Tuple[SnippetConfig, ParsedGitHubURL]]] = {}
+        repos: Set[Tuple[str, str, str]] = set()
+        # Higher-priority files claim the remaining budget first.
+        for key, entries in sorted(groups.items(), key=lambda item: rank(item[1])):
+            priority = PRIORITIES[rank(entries)]
+            # Each file costs a fetch, plus a head lookup for the first file of a repo.
+            upcoming = len(admitted) + len(repos | {key[:3]})
+            if budget.admits(priority, upcoming):
+                admitted[key] = entries
+                repos.add(key[:3])
+                continue
+            for snippet, _ in entries:
+                print(f"Deferring {snippet.file_url} ({priority} priority): GitHub request budget is low")
+                cycle.mark_deferred(snippet.id)
+        return admitted
+
+    def _max_line(self, entries: List[Tuple[SnippetConfig, ParsedGitHubURL]]) -> Optional[int]:
+        # Anchored snippets may have moved anywhere, so their files are read whole.
+        if any(snippet.anchored for snippet, _ in entries):
+            return None
+        return max(snippet.end_line for snippet, _ in entries)
 
+    def _extract(self, snippet: SnippetConfig, lines: List[str]) -> Tuple[str, bool]:
+        try:
+            new_code: Optional[str] = self.github_client.extract_line_range(lines, snippet.start_line, snippet.end_line)
+        except ValueError:
+            if not snippet.anchored:
+                raise
+            new_code = None
+
+        if new_code is not None and (
+            not snippet.anchored
+            or not snippet.last_seen_digest
+            or content_digest(new_code) == snippet.last_seen_digest
+        ):
+            return new_code, False
+
+        previous = self.config_manager.state.get_blob(snippet.last_seen_digest)
+        match = find_snippet(lines, previous, snippet.start_line) if previous else None
+        if match is None:
+            if new_code is None:
+                raise ValueError("Requested lines are out of range of the file")
+            return new_code, False
+
+        moved = (match.start_line, match.end_line) != (snippet.start_line, snippet.end_line)
+        if moved:
+            kind = "exact" if match.exact else f"{match.similarity:.0%} similar"
+            print(
+                f"Relocated {snippet.file_url} from L{snippet.start_line}-L{snippet.end_line} "
+                f"to L{match.start_line}-L{match.end_line} ({kind} match)"
+            )
+            snippet.start_line = match.start_line
+            snippet.end_line = match.end_line
+        return self.github_client.extract_line_range(lines, match.start_line, match.end_line), moved
+
+    def _resolve_heads(
+        self,
+        fetcher: ConcurrentFetcher,
+        groups: Dict[Tuple[str, str, str, str], List[Tuple[SnippetConfig, ParsedGitHubURL]]],
+    ) -> Dict[Tuple[str, str, str], str]:
+        repos = list(dict.fromkeys(key[:3] for key in groups))
+        results = fetcher.map(
+            lambda repo_key: self.github_client.resolve_head(*repo_key),
+            repos,
+            host_of=lambda repo_key: self.github_client.git_host(),
+        )
+
+        heads: Dict[Tuple[str, str, str], str] = {}
+        for (owner, repo, branch), (sha, error) in zip(repos, results):
+            if error is not None:
+                print(f"Could not resolve head of {owner}/{repo}@{branch}: {error}")
+            elif sha:
+                heads[(owner, repo, branch)] = sha
+                if self.debug:
+                    print(f"[DEBUG] {owner}/{repo}@{branch} head = {sha}")
+        return heads
+
+    def _get_summarizer(self, config: AppConfig) -> Tuple[Optional[Summarizer], Optional[str]]:
         provider = (self.provider or "").lower()
         model = self.model
 
-        ollama_client = None
-        gemini_client = None
-        openai_client = None
-
         if provider == "ollama":
-            endpoint = config.ollama_endpoint
             model = model or config.ollama_model
-            if endpoint and model:
-                ollama_client = OllamaClient(endpoint=endpoint, model=model)
+            credential = config.ollama_endpoint
         elif provider == "gemini":
-            key = config.gemini_api_key
             model = model or config.gemini_model
-            if key and model:
-                gemini_client = GeminiClient(api_key=key, model=model, endpoint=None)
+            credential = config.gemini_api_key
         elif provider == "openai":
-            key = config.openai_key
             model = model or config.openai_model
-            if key and model:
-                openai_client = OpenAIClient(api_key=key, model=model, endpoint=None)
+            credential = config.openai_key
+        else:
+            credential = ""
+        key = (
+            provider,
+            credential,
+            model or "",
+            config.cache_dir,
+            config.ai_cache_max_entries,
+            config.ai_cache_ttl_seconds,
+        )
+
+        if key == self._summarizer_key:
+            return self._summarizer, self._diff_source
+
+        summarizer: Optional[Summarizer] = None
+        diff_source: Optional[str] = None
+        if provider == "ollama" and config.ollama_endpoint and model:
+            summarizer = OllamaClient(endpoint=config.ollama_endpoint, model=model, transport=self.transport)
+            diff_source = "Ollama"
+        elif provider == "gemini" and config.gemini_api_key and model:
+            summarizer = GeminiClient(
+                api_key=config.gemini_api_key,
+                model=model,
+                endpoint=config.gemini_endpoint or None,
+                transport=self.transport,
+            )
+            diff_source = "Gemini"
+        elif provider == "openai" and config.openai_key and model:
+            summarizer = OpenAIClient(
+                api_key=config.openai_key,
+                model=model,
+                endpoint=config.openai_endpoint or None,
+                transport=self.transport,
+            )
+            diff_source = "OpenAI"
+
+        if self._summary_cache is not None:
+            self._summary_cache.close()
+            self._summary_cache = None
+        if summarizer is not None and config.ai_cache_max_entries > 0:
+            self._summary_cache = SummaryCache(
+                os.path.join(config.cache_dir, "summaries.db"),
+                max_entries=config.ai_cache_max_entries,
+                ttl_seconds=config.ai_cache_ttl_seconds,
+            )
+            summarizer = CachedSummarizer(summarizer, self._summary_cache, provider, model, PROMPT_VERSION)
 
         if self.debug:
             print(f"[DEBUG] provider={provider} model={model}")
 
-        updated = False
-        for snippet in config.snippets:
-            try:
-                parsed = self.github_client.parse_github_url(snippet.file_url)
-                content = self.github_client.fetch_file_content(parsed)
-                new_code = self.github_client.extract_lines(content, parsed.start_line, parsed.end_line)
+        self._summarizer_key = key
+        self._summarizer = summarizer
+        self._diff_source = diff_source
+        return summarizer, diff_source
+
+    def _apply_versions(self, snippet: SnippetConfig, etag: str, head: Optional[str]) -> bool:
+        dirty = False
+        if snippet.last_seen_etag != etag:
+            snippet.last_seen_etag = etag
+            dirty = True
+        if head and snippet.head_sha != head:
+            snippet.head_sha = head
+            dirty = True
+        return dirty
+
+    def _check_snippet(
+        self, snippet: SnippetConfig, new_code: str, diff_engine: DiffEngine
+    ) -> Tuple[Optional[DetectedChange], bool]:
+        new_digest = content_digest(new_code)
+        if self.debug:
+            print(
+                f"[DEBUG] Checking {snippet.file_url}\n"
+                f"        last_seen hash = {snippet.last_seen_digest[:10]}\n"
+                f"        new hash       = {new_digest[:10]}"
+            )
+
+        if new_digest == snippet.last_seen_digest:
+            print(f"No change in {snippet.file_url}")
+            return None, False
+
+        state = self.config_manager.state
+        last_code = state.get_blob(snippet.last_seen_digest)
+        new_fingerprint = fingerprint(new_code, snippet.normalize, snippet.file_path) if snippet.normalize else ""
+        if last_code is None:
+            state.put_blob(new_code)
+            snippet.last_seen_digest = new_digest
+            snippet.last_seen_fingerprint = new_fingerprint
+            snippet.original_digest = snippet.original_digest or new_digest
+            print(f"Initialized snippet baseline for {snippet.file_url}")
+            return None, True
+
+        if new_fingerprint:
+            same = new_fingerprint == snippet.last_seen_fingerprint
+            if not same:
+                # The stored fingerprint may be missing or from another mode; the baseline body decides.
+                same = new_fingerprint == fingerprint(last_code, snippet.normalize, snippet.file_path)
+            if same:
+                # Formatting-only: no diff, summary or alert, but later diffs start from the new text.
+                state.put_blob(new_code)
+                snippet.last_seen_digest = new_digest
+                snippet.last_seen_fingerprint = new_fingerprint
+                SNIPPET_RESULTS.inc(result="formatting_only")
+                print(f"Formatting-only change in {snippet.file_url}; baseline updated")
+                return None, True
+
+        print(f"Change detected in {snippet.file_url}")
+        diff_text = build_diff(last_code, new_code, diff_engine)
+        change = DetectedChange(
+            snippet=snippet,
+            diff_text=diff_text,
+            new_code=new_code,
+            new_digest=new_digest,
+            new_fingerprint=new_fingerprint,
+        )
+        return change, False
 
+    def _deliver(self, change: DetectedChange, diff_source: Optional[str]) -> bool:
+        snippet = change.snippet
+        accepted = self.notifier.notify_change(
+            snippet,
+            change.diff_text,
+            diff_summary=change.summary,
+            diff_source=diff_source,
+        )
+        if accepted is False:
+            print(f"Notification for {snippet.file_url} was not accepted; will retry next cycle")
+            return False
+
+        self._commit_change(change)
+        return True
+
+    def _commit_change(self, change: DetectedChange) -> None:
+        snippet = change.snippet
+        self.config_manager.state.put_blob(change.new_code)
+        snippet.last_seen_digest = change.new_digest
+        snippet.last_seen_fingerprint = change.new_fingerprint
+        self._apply_versions(snippet, change.etag, change.head)
+        self.config_manager.save_snippet_state(snippet)
+
+    def _hold_for_digest(self, change: DetectedChange, diff_source: Optional[str]) -> None:
+        notice = ChangeNotice(change.snippet, change.diff_text, change.summary, diff_source)
+        with self._digest_lock:
+            # Uncommitted changes are detected again every cycle; the newest diff
+            # against the baseline replaces the one held from earlier cycles.
+            self._digest_pending[change.snippet.id] = (change, notice)
+            if self._digest_since is None:
+                self._digest_since = time.monotonic()
+
+    def _flush_digest(self, window_seconds: int) -> int:
+        with self._digest_lock:
+            if not self._digest_pending:
+                return 0
+            if time.monotonic() - (self._digest_since or 0.0) < window_seconds:
                 if self.debug:
-                    print(
-                        f"[DEBUG] Checking {snippet.file_url}\n"
-                        f"        last_seen hash = {hash_str(snippet.last_seen_code)}\n"
-                        f"        new hash       = {hash_str(new_code)}"
-                    )
-
-                if not snippet.last_seen_code:
-                    snippet.original_code = new_code
-                    snippet.last_seen_code = new_code
-                    updated = True
-                    print(f"Initialized snippet baseline for {snippet.file_url}")
-                    continue
+                    print(f"[DEBUG] Holding {len(self._digest_pending)} change(s) for the digest window")
+                return 0
+            held = list(self._digest_pending.values())
+            self._digest_pending.clear()
+            self._digest_since = None
 
-                if new_code != snippet.last_seen_code:
-                    print(f"Change detected in {snippet.file_url}")
-
-                    last_code = snippet.last_seen_code
-
-                    raw_diff_lines = list(
-                        difflib.unified_diff(
-                            last_code.splitlines(),
-                            new_code.splitlines(),
-                            fromfile="last_snippet",
-                            tofile="new_snippet",
-                            lineterm="",
-                        )
-                    )
-
-                    filtered_lines = []
-                    for line in raw_diff_lines:
-                        if line.startswith('--- ') or line.startswith('+++ '):
-                            continue
-                        if line.startswith('@@'):
-                            filtered_lines.append(line)
-                        elif line.startswith('+') or line.startswith('-'):
-                            filtered_lines.append(line)
-                    diff_text = "\n".join(filtered_lines).strip()
-
-                    diff_summary = None
-                    diff_source = None
-
-                    if openai_client:
-                        diff_summary = openai_client.summarize_diff(diff_text)
-                        diff_source = "OpenAI"
-                    elif gemini_client:
-                        diff_summary = gemini_client.summarize_diff(diff_text)
-                        diff_source = "Gemini"
-                    elif ollama_client:
-                        diff_summary = ollama_client.summarize_diff(diff_text)
-                        diff_source = "Ollama"
-
-                    self.notifier.notify_change(
-                        snippet,
-                        diff_text,
-                        diff_summary=diff_summary,
-                        diff_source=diff_source,
-                    )
-
-                    snippet.last_seen_code = new_code
-                    updated = True
-                else:
-                    print(f"No change in {snippet.file_url}")
+        committed = 0
+        if not hasattr(self.notifier, "notify_digest"):
+            for change, notice in held:
+                try:
+                    if self._deliver(change, notice.diff_source):
+                        committed += 1
+                except Exception as e:
+                    print(f"Error while delivering change for {change.snippet.file_url}: {e}")
+            return committed
 
-            except Exception as e:
-                print(f"Error while checking snippet {snippet.file_url}: {e}")
+        try:
+            accepted = self.notifier.notify_digest([notice for _, notice in held])
+        except Exception as e:
+            print(f"Error while delivering digest of {len(held)} changes: {e}")
+            return 0
+        if accepted is False:
+            print(f"Digest of {len(held)} changes was not accepted; will retry next cycle")
+            return 0
 
-        if updated:
-            self.config_manager.save(config)
+        for change, _ in held:
+            try:
+                self._commit_change(change)
+                committed += 1
+            except Exception as e:
+                print(f"Error while committing change for {change.snippet.file_url}: {e}")
+        print(f"Sent digest of {len(held)} change(s)")
+        return committed
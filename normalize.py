@@ -0,0 +1,119 @@
+import hashlib
+import io
+import keyword
+import os
+import re
+import textwrap
+import tokenize
+from typing import List
+
+NORMALIZE_MODES = ("auto", "solidity", "javascript", "python", "text")
+
+_EXTENSIONS = {
+    ".sol": "solidity",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".ts": "javascript",
+    ".tsx": "javascript",
+    ".py": "python",
+    ".pyi": "python",
+}
+
+# Comments and strings come first so that "//" inside a string or "*/" inside a
+# comment are never read as anything else. Operator characters are matched as
+# runs, so "a++ +b" and "a+ ++b" stay different once whitespace is gone.
+_C_LIKE_TOKEN = re.compile(
+    r"""
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+    |(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)
+    |(?P<space>\s+)
+    |(?P<operator>[-+*/%=<>!&|^~?:]+)
+    |(?P<word>[\w$]+)
+    |(?P<other>.)
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+_OPENERS = {"(": ")", "[": "]", "{": "}"}
+
+
+def detect_language(file_path: str) -> str:
+    return _EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), "text")
+
+
+def _drop_trailing_commas(tokens: List[str], tuples: bool) -> List[str]:
+    # Formatters add and remove a comma before a closing bracket. In Python
+    # "(a,)" and "d[a,]" hold a tuple while "(a)" and "d[a]" do not, so with
+    # tuples=True a lone comma stays in a parenthesized group and a subscript,
+    # and goes in a call, a list or when the group holds another comma as well.
+    out: List[str] = []
+    groups: List[List[int]] = []
+    for token in tokens:
+        if token in _OPENERS:
+            previous = out[-1] if out else ""
+            trailer = previous in (")", "]") or (previous.isidentifier() and not keyword.iskeyword(previous))
+            groups.append([0, trailer])
+        elif token == ",":
+            if groups:
+                groups[-1][0] += 1
+        elif token in (")", "]", "}"):
+            commas, trailer = groups.pop() if groups else (0, False)
+            trailing = len(out) >= 2 and out[-1] == "," and out[-2] not in (",", *_OPENERS)
+            # A "(" after a name is a call; a "[" after one is a subscript.
+            tuple_group = (token == ")" and not trailer) or (token == "]" and trailer)
+            if trailing and not (tuples and tuple_group and commas < 2):
+                out.pop()
+        out.append(token)
+    return out
+
+
+def _c_like_tokens(code: str) -> List[str]:
+    tokens = [
+        match.group()
+        for match in _C_LIKE_TOKEN.finditer(code)
+        if match.lastgroup not in ("comment", "space")
+    ]
+    return _drop_trailing_commas(tokens, tuples=False)
+
+
+def _python_tokens(code: str) -> List[str]:
+    skipped = (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER)
+    tokens: List[str] = []
+    for token in tokenize.generate_tokens(io.StringIO(textwrap.dedent(code)).readline):
+        if token.type in skipped:
+            continue
+        if token.type == tokenize.NEWLINE:
+            tokens.append("<newline>")
+        elif token.type == tokenize.INDENT:
+            tokens.append("<indent>")
+        elif token.type == tokenize.DEDENT:
+            tokens.append("<dedent>")
+        else:
+            tokens.append(token.string)
+    return _drop_trailing_commas(tokens, tuples=True)
+
+
+def _text_tokens(code: str) -> List[str]:
+    return [" ".join(line.split()) for line in code.splitlines() if line.strip()]
+
+
+def normalized_tokens(code: str, language: str) -> List[str]:
+    if language in ("solidity", "javascript"):
+        return _c_like_tokens(code)
+    if language == "python":
+        try:
+            return _python_tokens(code)
+        except (tokenize.TokenError, SyntaxError):
+            # A range cut mid-statement may not tokenize; whitespace is all we can safely ignore there.
+            return _text_tokens(code)
+    if language == "text":
+        return _text_tokens(code)
+    raise ValueError(f"Unknown normalize mode {language!r}; expected one of {', '.join(NORMALIZE_MODES)}")
+
+
+def fingerprint(code: str, mode: str, file_path: str) -> str:
+    language = detect_language(file_path) if mode == "auto" else mode
+    body = "\x1f".join(normalized_tokens(code, language))
+    return hashlib.sha256(f"{language}\x00{body}".encode("utf-8")).hexdigest()
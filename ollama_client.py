@@ -1,21 +1,30 @@
-import requests
-from typing import Optional
+from typing import List, Optional
+
+from ai_batch import SINGLE_SYSTEM_PROMPT, DiffRequest, render_single, summarize_in_batches
+from tracing import span
+from transport import HttpTransport, default_transport
 
 
 class OllamaClient:
-    def __init__(self, endpoint: str, model: str):
+    # Local models usually run with a small context window.
+    BATCH_TOKEN_BUDGET = 3000
+    BATCH_MAX_ITEMS = 8
+
+    def __init__(self, endpoint: str, model: str, transport: Optional[HttpTransport] = None):
         self.endpoint = endpoint.rstrip("/")
         self.model = model
+        self.transport = transport or default_transport()
 
-    def summarize_diff(self, diff_text: str) -> Optional[str]:
+    def summarize_diff(self, diff_text: str, note: str = "") -> Optional[str]:
         if not diff_text.strip():
             return None
+        return self.complete(SINGLE_SYSTEM_PROMPT, render_single(diff_text, note))
+
+    def summarize_diffs(self, requests: List[DiffRequest]) -> List[Optional[str]]:
+        return summarize_in_batches(self, requests)
+
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> Optional[str]:
         url = f"{self.endpoint}/api/chat"
-        system_prompt = (
-            "You are a code review assistant. The user will send a unified diff containing only changed lines. "
-            "Summarize the change in 1–3 short bullet points, focusing on behavior changes, security impact, and configuration changes. Reply in plain text."
-        )
-        user_prompt = f"Diff:\n\n{diff_text}"
         payload = {
             "model": self.model,
             "messages": [
@@ -24,15 +33,20 @@ class OllamaClient:
             ],
             "stream": False,
         }
+        if max_tokens:
+            payload["options"] = {"num_predict": max_tokens}
         try:
-            resp = requests.post(url, json=payload, timeout=30)
+            with span("ai.complete", provider="ollama", model=self.model, prompt_chars=len(user_prompt)) as attrs:
+                resp = self.transport.post(url, json=payload, timeout=30)
+                attrs["status"] = resp.status_code
             resp.raise_for_status()
             data = resp.json()
             message = data.get("message") or {}
             content = message.get("content")
             if isinstance(content, str) and content.strip():
                 return content.strip()
-            return str(data)[:1000]
+            print(f"Unexpected Ollama response shape from {url}")
+            return None
         except Exception as e:
             print(f"Error talking to Ollama at {url}: {e}")
             return None
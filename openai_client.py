@@ -1,30 +1,43 @@
-import requests
-from typing import Optional
+from typing import List, Optional
+
+from ai_batch import SINGLE_SYSTEM_PROMPT, DiffRequest, render_single, summarize_in_batches
+from tracing import span
+from transport import HttpTransport, default_transport
 
 
 class OpenAIClient:
-    def __init__(self, api_key: str, model: str, endpoint: Optional[str] = None):
+    BATCH_TOKEN_BUDGET = 12000
+    BATCH_MAX_ITEMS = 20
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        endpoint: Optional[str] = None,
+        transport: Optional[HttpTransport] = None,
+    ):
         self.api_key = api_key
         self.model = model
+        self.transport = transport or default_transport()
         self.base_endpoint = (endpoint or "https://api.openai.com/v1").rstrip("/")
 
-    def summarize_diff(self, diff_text: str) -> Optional[str]:
+    def summarize_diff(self, diff_text: str, note: str = "") -> Optional[str]:
         if not diff_text.strip():
             return None
-        url = f"{self.base_endpoint}/chat/completions"
-        system_prompt = (
-            "You are a code review assistant. The user will send a unified diff that contains only changed lines. "
-            "Summarize the change in 1–3 concise bullet points, focusing on behavior changes, security impact, and configuration changes. Reply in plain text."
-        )
-        user_prompt = f"Diff:\n\n{diff_text}"
+        return self.complete(SINGLE_SYSTEM_PROMPT, render_single(diff_text, note), max_tokens=256)
 
+    def summarize_diffs(self, requests: List[DiffRequest]) -> List[Optional[str]]:
+        return summarize_in_batches(self, requests)
+
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> Optional[str]:
+        url = f"{self.base_endpoint}/chat/completions"
         payload = {
             "model": self.model,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
-            "max_tokens": 256,
+            "max_tokens": max_tokens or 256,
             "temperature": 0.0,
         }
         headers = {
@@ -32,7 +45,9 @@ class OpenAIClient:
             "Authorization": f"Bearer {self.api_key}",
         }
         try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=30)
+            with span("ai.complete", provider="openai", model=self.model, prompt_chars=len(user_prompt)) as attrs:
+                resp = self.transport.post(url, json=payload, headers=headers, timeout=30)
+                attrs["status"] = resp.status_code
             resp.raise_for_status()
             data = resp.json()
             choices = data.get("choices") or []
@@ -40,8 +55,9 @@ class OpenAIClient:
                 msg = choices[0].get("message") or {}
                 content = msg.get("content")
                 if isinstance(content, str):
-                    return content.strip()
-            return str(data)[:1000]
+                    return content.strip() or None
+            print(f"Unexpected OpenAI response shape from {url}")
+            return None
         except Exception as e:
             print(f"Error talking to OpenAI at {url}: {e}")
             return None
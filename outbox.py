@@ -0,0 +1,84 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class OutboxMessage:
+    id: int
+    target: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class Outbox:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        target TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        created_at REAL NOT NULL,
+        last_error TEXT NOT NULL DEFAULT ''
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (channel, next_attempt);
+    """
+
+    def __init__(self, path: str = "outbox.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def put(self, channel: str, target: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            cur = self._conn.execute(
+                "INSERT INTO outbox (channel, target, payload, next_attempt, created_at) VALUES (?, ?, ?, ?, ?)",
+                (channel, target, json.dumps(payload), now, now),
+            )
+            return cur.lastrowid
+
+    def due(self, channel: str, now: float, limit: int = 50) -> List[OutboxMessage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, target, payload, attempts FROM outbox WHERE channel = ? AND next_attempt <= ? "
+                "ORDER BY id LIMIT ?",
+                (channel, now, limit),
+            ).fetchall()
+        return [OutboxMessage(id=row[0], target=row[1], payload=json.loads(row[2]), attempts=row[3]) for row in rows]
+
+    def next_due(self, channel: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt) FROM outbox WHERE channel = ?", (channel,)).fetchone()
+        return row[0]
+
+    def pending(self, channel: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE channel = ?", (channel,)).fetchone()[0]
+
+    def delete(self, ids: List[int]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def reschedule(self, ids: List[int], next_attempt: float, error: str, count_attempt: bool = True) -> None:
+        step = 1 if count_attempt else 0
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = attempts + ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                [(step, next_attempt, error, i) for i in ids],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,188 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import STAGE_ERRORS, STAGE_ITEMS, STAGE_SECONDS
+
+_STOP = object()
+
+Handler = Callable[[List[Any]], Optional[Iterable[Any]]]
+ErrorHandler = Callable[[List[Any], Exception], Optional[Iterable[Any]]]
+
+
+class StageTimeout(Exception):
+    pass
+
+
+class StageCancelled(Exception):
+    pass
+
+
+class _CallToken:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.cancelled = False
+
+
+_local = threading.local()
+
+
+@contextmanager
+def committing() -> Iterator[None]:
+    # Handlers wrap the writes that must not happen once their stage gave up on
+    # the call. A timeout waits for a block that already started, and blocks
+    # entered after it raise StageCancelled instead of running.
+    token: Optional[_CallToken] = getattr(_local, "token", None)
+    if token is None:
+        yield
+        return
+    with token.lock:
+        if token.cancelled:
+            raise StageCancelled("stage already gave up on this call")
+        yield
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        handler: Handler,
+        workers: int = 1,
+        queue_size: int = 64,
+        timeout: Optional[float] = None,
+        batch_size: int = 1,
+        linger: float = 0.0,
+        on_error: Optional[ErrorHandler] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.batch_size = max(1, batch_size)
+        self.linger = max(0.0, linger)
+        self.on_error = on_error
+        self.downstream: Optional["Stage"] = None
+        # put() blocks once the queue is full, so a slow stage throttles the
+        # one feeding it instead of buffering a whole cycle in memory.
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item: Any) -> None:
+        self.queue.put(item)
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _take(self) -> Tuple[List[Any], bool]:
+        item = self.queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._take()
+            if batch:
+                self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: List[Any]) -> None:
+        STAGE_ITEMS.inc(len(batch), stage=self.name)
+        started = time.perf_counter()
+        try:
+            outputs = self._call(batch)
+        except Exception as e:
+            STAGE_ERRORS.inc(stage=self.name, kind="timeout" if isinstance(e, StageTimeout) else "error")
+            if self.on_error is None:
+                print(f"Error in {self.name} stage for {len(batch)} item(s): {e}")
+                return
+            try:
+                outputs = self.on_error(batch, e)
+            except Exception as nested:
+                print(f"Error in {self.name} stage error handler: {nested}")
+                return
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=self.name)
+
+        if outputs and self.downstream is not None:
+            for output in outputs:
+                self.downstream.put(output)
+
+    def _call(self, batch: List[Any]) -> Optional[List[Any]]:
+        if self.timeout is None:
+            outputs = self.handler(batch)
+            return list(outputs) if outputs is not None else None
+
+        # A thread cannot be killed, so a call that overruns is abandoned: it is
+        # cancelled, its result is discarded and the worker moves on to the next item.
+        result: Dict[str, Any] = {}
+        token = _CallToken()
+
+        def target() -> None:
+            _local.token = token
+            try:
+                outputs = self.handler(batch)
+                result["value"] = list(outputs) if outputs is not None else None
+            except BaseException as e:
+                result["error"] = e
+
+        call = threading.Thread(target=target, name=f"{self.name}-call", daemon=True)
+        call.start()
+        call.join(self.timeout)
+        if call.is_alive():
+            with token.lock:
+                token.cancelled = True
+        if call.is_alive():
+            raise StageTimeout(f"{self.name} stage timed out after {self.timeout:g}s")
+        if "error" in result:
+            raise result["error"]
+        return result.get("value")
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.downstream = downstream
+
+    def __enter__(self) -> "Pipeline":
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def submit(self, item: Any) -> None:
+        self.stages[0].put(item)
+
+    def close(self) -> None:
+        # Stages drain in order: a stage is only told to stop after everything
+        # upstream of it has finished, so nothing in flight is dropped.
+        for stage in self.stages:
+            stage.close()
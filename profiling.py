@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+
+class SamplingProfiler:
+    # Wall-clock sampling of every thread, so time spent waiting on the network
+    # or in a pipeline queue shows up as well as time on the CPU.
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.started = time.time()
+        self.profile_id = uuid.uuid4().hex[:16]
+        self._stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(labels))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        # One "frame;frame;frame count" line per stack: the input format of
+        # flamegraph.pl, speedscope and inferno.
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self._stacks.items()))
+
+    def write(self, directory: str, name: str = "cycle", run_id: Optional[str] = None) -> str:
+        # Named like trace files, so two cycles in the same second never collide.
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        path = os.path.join(directory, f"{name}-{stamp}-{run_id or self.profile_id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        return path
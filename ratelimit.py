@@ -0,0 +1,161 @@
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Mapping, Optional
+
+from metrics import RATE_LIMIT_HITS
+
+PRIORITIES = ("high", "normal", "low")
+
+
+class RateLimitedError(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def take(self, tokens: float = 1.0) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # Retry-After may also be an HTTP date.
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_number(headers: Mapping[str, Any], name: str) -> Optional[float]:
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(slots=True)
+class BudgetSnapshot:
+    limit: Optional[int]
+    remaining: Optional[int]
+    reset_at: float
+    blocked_until: float
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if self.remaining is None or not self.limit:
+            return None
+        return self.remaining / self.limit
+
+
+class RequestBudget:
+    # Requests held back for high-priority snippets.
+    RESERVE = 50
+    # Below this share of the hourly limit, low-priority snippets are deferred.
+    LOW_WATERMARK = 0.2
+    # Secondary limits do not always say how long to wait.
+    SECONDARY_BACKOFF = 60.0
+    BURST = 20
+
+    def __init__(self) -> None:
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self._bucket: Optional[TokenBucket] = None
+        self._lock = threading.Lock()
+
+    def observe(self, status: int, headers: Mapping[str, Any], body: str = "") -> None:
+        now = time.time()
+        limit = _header_number(headers, "X-RateLimit-Limit")
+        remaining = _header_number(headers, "X-RateLimit-Remaining")
+        reset_at = _header_number(headers, "X-RateLimit-Reset")
+        with self._lock:
+            if remaining is not None:
+                self.remaining = int(remaining)
+                self.limit = int(limit) if limit is not None else self.limit
+                self.reset_at = reset_at or self.reset_at
+                # Spread what is left over the rest of the window, while still
+                # letting a quarter of it go out in one burst.
+                spendable = max(self.remaining - self.RESERVE, 1)
+                rate = spendable / max(self.reset_at - now, 1.0)
+                capacity = max(self.BURST, spendable / 4)
+                if self._bucket is None:
+                    self._bucket = TokenBucket(rate, capacity)
+                self._bucket.rate = rate
+                self._bucket.capacity = capacity
+
+            if status not in (403, 429):
+                return
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                blocked = now + retry_after
+            elif remaining == 0 and self.reset_at:
+                blocked = self.reset_at
+            elif status == 429 or "secondary rate limit" in body.lower():
+                blocked = now + self.SECONDARY_BACKOFF
+            else:
+                return
+            RATE_LIMIT_HITS.inc(service="github")
+            if blocked > self.blocked_until:
+                self.blocked_until = blocked
+                print(f"GitHub rate limit hit; pausing requests for {blocked - now:.0f}s")
+
+    def admits(self, priority: str = "normal", upcoming: int = 0) -> bool:
+        now = time.time()
+        with self._lock:
+            if self.blocked_until > now:
+                return False
+            if self.remaining is None or (self.reset_at and now >= self.reset_at):
+                return True
+            left = self.remaining - upcoming
+            if priority == "high":
+                return left > 0
+            if priority == "low":
+                floor = self.limit * self.LOW_WATERMARK if self.limit else self.RESERVE
+                return left > max(floor, self.RESERVE)
+            return left > self.RESERVE
+
+    def pace(self, max_wait: float) -> None:
+        now = time.time()
+        with self._lock:
+            # Once the window has reset, the old pace no longer applies.
+            bucket = self._bucket if now < self.reset_at else None
+            wait = max(self.blocked_until - now, 0.0)
+        if bucket is not None:
+            wait = max(wait, bucket.wait_time())
+        if wait > max_wait:
+            raise RateLimitedError(f"GitHub request budget exhausted; next request possible in {wait:.0f}s")
+        if wait > 0:
+            time.sleep(wait)
+        if bucket is not None:
+            bucket.take()
+
+    def snapshot(self) -> BudgetSnapshot:
+        with self._lock:
+            return BudgetSnapshot(self.limit, self.remaining, self.reset_at, self.blocked_until)
@@ -0,0 +1,90 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+_MODULUS = (1 << 61) - 1
+_BASE = 1_000_003
+
+# Lines occurring more often than this in the file (closing braces, blank
+# lines, "end") carry no positional information and are left out of voting.
+_MAX_LINE_OCCURRENCES = 32
+
+
+@dataclass(slots=True)
+class Relocation:
+    start_line: int
+    end_line: int
+    exact: bool
+    similarity: float
+
+
+def _line_hashes(lines: List[str]) -> List[int]:
+    return [hash(line) % _MODULUS for line in lines]
+
+
+def _exact_matches(lines: List[str], body_lines: List[str]) -> List[int]:
+    n, m = len(lines), len(body_lines)
+    hashes = _line_hashes(lines)
+    target = 0
+    for h in _line_hashes(body_lines):
+        target = (target * _BASE + h) % _MODULUS
+
+    top = pow(_BASE, m - 1, _MODULUS)
+    window = 0
+    matches: List[int] = []
+    for i in range(n):
+        if i >= m:
+            window = (window - hashes[i - m] * top) % _MODULUS
+        window = (window * _BASE + hashes[i]) % _MODULUS
+        start = i - m + 1
+        if start >= 0 and window == target and lines[start : i + 1] == body_lines:
+            matches.append(start)
+    return matches
+
+
+def _best_offset(lines: List[str], body_lines: List[str], hint: int) -> Optional[Tuple[int, int]]:
+    wanted = {line for line in body_lines if line.strip()}
+    positions: Dict[str, List[int]] = {}
+    for i, line in enumerate(lines):
+        if line in wanted:
+            positions.setdefault(line, []).append(i)
+
+    votes: Counter = Counter()
+    for j, line in enumerate(body_lines):
+        found = positions.get(line)
+        if not found or len(found) > _MAX_LINE_OCCURRENCES:
+            continue
+        for i in found:
+            votes[i - j] += 1
+    if not votes:
+        return None
+
+    return max(votes.items(), key=lambda item: (item[1], -abs(item[0] - hint)))
+
+
+def find_snippet(
+    lines: List[str],
+    body: str,
+    hint_start: int,
+    min_similarity: float = 0.6,
+) -> Optional[Relocation]:
+    body_lines = body.splitlines()
+    m = len(body_lines)
+    if m == 0 or m > len(lines):
+        return None
+    hint = hint_start - 1
+
+    exact = _exact_matches(lines, body_lines)
+    if exact:
+        start = min(exact, key=lambda s: abs(s - hint))
+        return Relocation(start_line=start + 1, end_line=start + m, exact=True, similarity=1.0)
+
+    best = _best_offset(lines, body_lines, hint)
+    if best is None:
+        return None
+    offset, count = best
+    similarity = count / m
+    if similarity < min_similarity:
+        return None
+    start = min(max(offset, 0), len(lines) - m)
+    return Relocation(start_line=start + 1, end_line=start + m, exact=False, similarity=similarity)
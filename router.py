@@ -0,0 +1,133 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from metrics import NOTIFICATIONS, NOTIFY_SECONDS
+from models import ChangeNotice, SnippetConfig
+from tracing import span
+
+_Key = Tuple[str, str]
+
+
+def _notice_key(snippet: SnippetConfig, diff_text: str) -> _Key:
+    return snippet.id, hashlib.sha256((diff_text or "").encode("utf-8")).hexdigest()
+
+
+class NotificationRouter:
+    # Partial deliveries remembered so a retry skips channels that already have the message.
+    MAX_TRACKED = 1000
+
+    def __init__(self, channels: Dict[str, Any], timeout: float = 30.0):
+        self.channels = channels
+        self.timeout = timeout
+        # One small pool per channel, so a stalled channel only ties up its own threads.
+        self._pools = {
+            name: ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"notify-{name}") for name in channels
+        }
+        self._delivered: "OrderedDict[_Key, Set[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def route(self, snippet: SnippetConfig) -> List[str]:
+        wanted = [name for name in snippet.channels if name in self.channels]
+        if snippet.channels and not wanted:
+            print(f"None of the channels {snippet.channels} for {snippet.file_url} are enabled; using all channels")
+        return wanted or list(self.channels)
+
+    def notify_change(
+        self,
+        snippet: SnippetConfig,
+        diff_text: str,
+        diff_summary: Optional[str] = None,
+        diff_source: Optional[str] = None,
+    ) -> bool:
+        key = _notice_key(snippet, diff_text)
+        pending = self._pending(key, self.route(snippet))
+        calls = {
+            name: (lambda channel=self.channels[name]: channel.notify_change(snippet, diff_text, diff_summary, diff_source))
+            for name in pending
+        }
+        accepted = self._fan_out(calls)
+        return self._record({name: [key] for name in pending}, accepted, [key])
+
+    def notify_digest(self, notices: List[ChangeNotice]) -> bool:
+        keys = [_notice_key(n.snippet, n.diff_text) for n in notices]
+        per_channel: Dict[str, List[int]] = {}
+        for index, (notice, key) in enumerate(zip(notices, keys)):
+            for name in self._pending(key, self.route(notice.snippet)):
+                per_channel.setdefault(name, []).append(index)
+
+        calls = {
+            name: (lambda name=name, indices=indices: self._send_digest(name, [notices[i] for i in indices]))
+            for name, indices in per_channel.items()
+        }
+        accepted = self._fan_out(calls)
+        return self._record(
+            {name: [keys[i] for i in indices] for name, indices in per_channel.items()},
+            accepted,
+            keys,
+        )
+
+    def _send_digest(self, name: str, notices: List[ChangeNotice]) -> bool:
+        channel = self.channels[name]
+        if hasattr(channel, "notify_digest"):
+            return channel.notify_digest(notices) is not False
+        results = [
+            channel.notify_change(n.snippet, n.diff_text, diff_summary=n.diff_summary, diff_source=n.diff_source)
+            for n in notices
+        ]
+        return all(result is not False for result in results)
+
+    def _pending(self, key: _Key, routes: List[str]) -> List[str]:
+        with self._lock:
+            done = self._delivered.get(key, set())
+        return [name for name in routes if name not in done]
+
+    def _fan_out(self, calls: Dict[str, Callable[[], Any]]) -> Set[str]:
+        futures = {name: self._pools[name].submit(self._timed, name, call) for name, call in calls.items()}
+        wait(list(futures.values()), timeout=self.timeout)
+
+        accepted: Set[str] = set()
+        for name, future in futures.items():
+            if not future.done():
+                NOTIFICATIONS.inc(channel=name, result="timeout")
+                print(f"{name} notifier did not respond within {self.timeout:g}s")
+                continue
+            try:
+                if future.result() is not False:
+                    accepted.add(name)
+                    NOTIFICATIONS.inc(channel=name, result="accepted")
+                else:
+                    NOTIFICATIONS.inc(channel=name, result="rejected")
+            except Exception as e:
+                NOTIFICATIONS.inc(channel=name, result="error")
+                print(f"Error while notifying via {name}: {e}")
+        return accepted
+
+    def _timed(self, name: str, call: Callable[[], Any]) -> Any:
+        with NOTIFY_SECONDS.time(channel=name), span("notify", channel=name):
+            return call()
+
+    def _record(self, sent: Dict[str, List[_Key]], accepted: Set[str], keys: List[_Key]) -> bool:
+        with self._lock:
+            for name, name_keys in sent.items():
+                if name not in accepted:
+                    continue
+                for key in name_keys:
+                    self._delivered.setdefault(key, set()).add(name)
+                    self._delivered.move_to_end(key)
+
+            complete = all(name in accepted for name in sent)
+            if complete:
+                for key in keys:
+                    self._delivered.pop(key, None)
+            while len(self._delivered) > self.MAX_TRACKED:
+                self._delivered.popitem(last=False)
+        return complete
+
+    def close(self) -> None:
+        for name, channel in self.channels.items():
+            if hasattr(channel, "close"):
+                channel.close()
+            self._pools[name].shutdown(wait=False)
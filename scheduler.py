@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from models import AppConfig, SnippetConfig
+
+_FileKey = Tuple[str, str, str, str]
+
+
+@dataclass(slots=True)
+class CycleReport:
+    changed: Set[str] = field(default_factory=set)
+    failed: Set[str] = field(default_factory=set)
+    deferred: Set[str] = field(default_factory=set)
+
+
+def budget_pressure(fraction: Optional[float]) -> float:
+    # Stretch every interval once less than half of the request budget is
+    # left, up to tenfold when it is nearly gone.
+    if fraction is None or fraction >= 0.5:
+        return 1.0
+    return min(10.0, 0.5 / max(fraction, 0.05))
+
+
+def interval_bounds(snippet: SnippetConfig, config: AppConfig) -> Tuple[float, float]:
+    base = max(5, config.interval_seconds or 300)
+    low = snippet.min_interval or config.min_interval_seconds or max(5, base // 4)
+    high = snippet.max_interval or config.max_interval_seconds or base * 8
+    return float(low), float(max(low, high))
+
+
+def _file_key(snippet: SnippetConfig) -> _FileKey:
+    return snippet.owner, snippet.repo, snippet.branch, snippet.file_path
+
+
+class PollScheduler:
+    BACKOFF_FACTOR = 2.0
+    # A snippet due within this fraction of its interval is polled early when
+    # another snippet in the same file is fetched anyway.
+    COALESCE_FRACTION = 0.5
+
+    def __init__(self, jitter: float = 0.1, rng: Optional[random.Random] = None):
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._due: Dict[str, Tuple[float, int]] = {}
+        self._interval: Dict[str, float] = {}
+        self._file_of: Dict[str, _FileKey] = {}
+        self._files: Dict[_FileKey, Set[str]] = {}
+
+    def _push(self, snippet_id: str, due: float) -> None:
+        seq = next(self._seq)
+        self._due[snippet_id] = (due, seq)
+        heapq.heappush(self._heap, (due, seq, snippet_id))
+
+    def sync(self, config: AppConfig, now: float) -> None:
+        self.jitter = max(0.0, min(config.schedule_jitter, 0.5))
+        snippets = {s.id: s for s in config.snippets or []}
+        for snippet_id in list(self._due):
+            if snippet_id not in snippets:
+                self._forget(snippet_id)
+
+        for snippet_id, snippet in snippets.items():
+            low, high = interval_bounds(snippet, config)
+            if snippet_id not in self._due:
+                self._interval[snippet_id] = min(max(float(config.interval_seconds or 300), low), high)
+                self._track_file(snippet_id, _file_key(snippet))
+                self._push(snippet_id, now)
+            else:
+                # Bounds may have been edited while the daemon runs.
+                self._interval[snippet_id] = min(max(self._interval[snippet_id], low), high)
+                if self._file_of[snippet_id] != _file_key(snippet):
+                    self._forget_file(snippet_id)
+                    self._track_file(snippet_id, _file_key(snippet))
+
+        # Entries invalidated by rescheduling or removal are dropped lazily;
+        # compact once they dominate the heap.
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, seq, sid) for sid, (due, seq) in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _track_file(self, snippet_id: str, key: _FileKey) -> None:
+        self._file_of[snippet_id] = key
+        self._files.setdefault(key, set()).add(snippet_id)
+
+    def _forget_file(self, snippet_id: str) -> None:
+        key = self._file_of.pop(snippet_id, None)
+        siblings = self._files.get(key)
+        if siblings is not None:
+            siblings.discard(snippet_id)
+            if not siblings:
+                del self._files[key]
+
+    def _forget(self, snippet_id: str) -> None:
+        self._due.pop(snippet_id, None)
+        self._interval.pop(snippet_id, None)
+        self._forget_file(snippet_id)
+
+    def _peek(self) -> Optional[Tuple[float, str]]:
+        while self._heap:
+            due, seq, snippet_id = self._heap[0]
+            if self._due.get(snippet_id) == (due, seq):
+                return due, snippet_id
+            heapq.heappop(self._heap)
+        return None
+
+    def next_due(self) -> Optional[float]:
+        top = self._peek()
+        return top[0] if top else None
+
+    def pop_due(self, now: float) -> Set[str]:
+        due: Set[str] = set()
+        while True:
+            top = self._peek()
+            if top is None or top[0] > now:
+                break
+            heapq.heappop(self._heap)
+            due.add(top[1])
+
+        for snippet_id in list(due):
+            for sibling in self._files.get(self._file_of.get(snippet_id), ()):
+                if sibling in due:
+                    continue
+                sibling_due, _ = self._due[sibling]
+                if sibling_due - now <= self._interval[sibling] * self.COALESCE_FRACTION:
+                    due.add(sibling)
+        return due
+
+    def lag(self, snippet_ids: Iterable[str], now: float) -> float:
+        # Only meaningful between pop_due() and record(), while the popped slots are still known.
+        slots = [self._due[sid][0] for sid in snippet_ids if sid in self._due]
+        return max(0.0, now - min(slots)) if slots else 0.0
+
+    def record(
+        self,
+        config: AppConfig,
+        polled: Iterable[str],
+        report: CycleReport,
+        now: float,
+        pressure: float = 1.0,
+    ) -> None:
+        snippets = {s.id: s for s in config.snippets or []}
+        for snippet_id in polled:
+            snippet = snippets.get(snippet_id)
+            if snippet is None or snippet_id not in self._due:
+                continue
+            low, high = interval_bounds(snippet, config)
+            interval = self._interval[snippet_id]
+            if snippet_id in report.changed:
+                interval = low
+            elif snippet_id not in report.failed and snippet_id not in report.deferred:
+                interval = min(interval * self.BACKOFF_FACTOR, high)
+            self._interval[snippet_id] = interval
+
+            # Count from the slot the snippet was due in, not from when the
+            # cycle finished, so slow cycles do not make the cadence drift.
+            scheduled, _ = self._due[snippet_id]
+            spacing = interval * pressure
+            spread = spacing * self.jitter
+            due = min(scheduled, now) + spacing + self._rng.uniform(-spread, spread)
+            self._push(snippet_id, max(due, now))
+
+    def interval_of(self, snippet_id: str) -> Optional[float]:
+        return self._interval.get(snippet_id)
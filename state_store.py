@@ -0,0 +1,145 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Set
+
+from models import SNIPPET_STATE_FIELDS, SnippetConfig
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class StateStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS snippet_state (
+        id TEXT PRIMARY KEY,
+        file_url TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_snippet_state_file_url ON snippet_state (file_url);
+    CREATE TABLE IF NOT EXISTS blobs (
+        digest TEXT PRIMARY KEY,
+        body TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    """
+
+    # Unreferenced blobs younger than this are kept, so a body written by one
+    # process is not pruned by another before its snippet row is committed.
+    BLOB_GRACE_SECONDS = 3600
+
+    def __init__(self, path: str = "state.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._upgrade_schema()
+
+        columns = ", ".join(SNIPPET_STATE_FIELDS)
+        placeholders = ", ".join("?" for _ in SNIPPET_STATE_FIELDS)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in SNIPPET_STATE_FIELDS)
+        self._select_sql = f"SELECT id, {columns} FROM snippet_state"
+        self._upsert_sql = (
+            f"INSERT INTO snippet_state (id, file_url, {columns}, updated_at) "
+            f"VALUES (?, ?, {placeholders}, ?) "
+            f"ON CONFLICT (id) DO UPDATE SET file_url = excluded.file_url, {updates}, updated_at = excluded.updated_at"
+        )
+
+    def _upgrade_schema(self) -> None:
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(snippet_state)")}
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for name in SNIPPET_STATE_FIELDS:
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE snippet_state ADD COLUMN {name} TEXT NOT NULL DEFAULT ''")
+            if "last_seen_code" in existing:
+                self._move_inline_bodies_to_blobs()
+
+    def _move_inline_bodies_to_blobs(self) -> None:
+        rows = self._conn.execute("SELECT id, original_code, last_seen_code FROM snippet_state").fetchall()
+        now = time.time()
+        for snippet_id, original_code, last_seen_code in rows:
+            digests = []
+            for body in (original_code, last_seen_code):
+                if not body:
+                    digests.append("")
+                    continue
+                digest = content_digest(body)
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, body, created_at) VALUES (?, ?, ?)", (digest, body, now)
+                )
+                digests.append(digest)
+            self._conn.execute(
+                "UPDATE snippet_state SET original_digest = ?, last_seen_digest = ? WHERE id = ?",
+                (digests[0], digests[1], snippet_id),
+            )
+        self._conn.execute("ALTER TABLE snippet_state DROP COLUMN original_code")
+        self._conn.execute("ALTER TABLE snippet_state DROP COLUMN last_seen_code")
+
+    def _row(self, snippet: SnippetConfig) -> tuple:
+        return (snippet.id, snippet.file_url, *(getattr(snippet, name) for name in SNIPPET_STATE_FIELDS), time.time())
+
+    def load_into(self, snippets: Iterable[SnippetConfig]) -> Set[str]:
+        by_id = {s.id: s for s in snippets}
+        found: Set[str] = set()
+        with self._lock:
+            rows = self._conn.execute(self._select_sql).fetchall()
+        for snippet_id, *values in rows:
+            snippet = by_id.get(snippet_id)
+            if snippet is None:
+                continue
+            for name, value in zip(SNIPPET_STATE_FIELDS, values):
+                setattr(snippet, name, value)
+            found.add(snippet_id)
+        return found
+
+    def save_snippet(self, snippet: SnippetConfig) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(self._upsert_sql, self._row(snippet))
+
+    def save_snippets(self, snippets: List[SnippetConfig]) -> None:
+        keep_ids = [s.id for s in snippets]
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(self._upsert_sql, [self._row(s) for s in snippets])
+            existing = {row[0] for row in self._conn.execute("SELECT id FROM snippet_state")}
+            stale = [(snippet_id,) for snippet_id in existing.difference(keep_ids)]
+            self._conn.executemany("DELETE FROM snippet_state WHERE id = ?", stale)
+
+    def put_blob(self, body: str) -> str:
+        digest = content_digest(body)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "INSERT INTO blobs (digest, body, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (digest) DO UPDATE SET created_at = excluded.created_at",
+                (digest, body, time.time()),
+            )
+        return digest
+
+    def get_blob(self, digest: str) -> Optional[str]:
+        if not digest:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def prune_blobs(self) -> int:
+        cutoff = time.time() - self.BLOB_GRACE_SECONDS
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            cur = self._conn.execute(
+                "DELETE FROM blobs WHERE created_at < ? AND digest NOT IN ("
+                "SELECT original_digest FROM snippet_state UNION SELECT last_seen_digest FROM snippet_state)",
+                (cutoff,),
+            )
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
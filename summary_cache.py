@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Protocol
+
+from ai_batch import DiffRequest
+
+_HUNK_HEADER_RE = re.compile(r"^@@ .* @@")
+
+
+class Summarizer(Protocol):
+    def summarize_diff(self, diff_text: str, note: str = "") -> Optional[str]: ...
+
+    def summarize_diffs(self, requests: List[DiffRequest]) -> List[Optional[str]]: ...
+
+
+def normalize_diff(diff_text: str) -> str:
+    # Hunk positions differ between branches and forks carrying the same
+    # patch, so they are not part of the key.
+    lines = []
+    for line in (diff_text or "").replace("\r\n", "\n").split("\n"):
+        line = line.rstrip()
+        if _HUNK_HEADER_RE.match(line):
+            line = "@@"
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def summary_key(diff_text: str, provider: str, model: str, prompt_version: int, note: str = "") -> str:
+    # The note is part of the prompt, so it is part of the key.
+    material = "\0".join((provider.lower(), model, str(prompt_version), note.strip(), normalize_diff(diff_text)))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS summaries (
+        key TEXT PRIMARY KEY,
+        provider TEXT NOT NULL,
+        model TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries (last_used);
+    """
+
+    def __init__(self, path: str, max_entries: int = 2000, ttl_seconds: int = 30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT summary, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            summary, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (now, key))
+            return summary
+
+    def put(self, key: str, provider: str, model: str, summary: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, provider, model, summary, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, model, summary, now, now),
+            )
+            if self.ttl_seconds:
+                self._conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM summaries WHERE key IN ("
+                "SELECT key FROM summaries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedSummarizer:
+    def __init__(self, inner: Summarizer, cache: SummaryCache, provider: str, model: str, prompt_version: int):
+        self.inner = inner
+        self.cache = cache
+        self.provider = provider
+        self.model = model
+        self.prompt_version = prompt_version
+
+    def _key(self, diff_text: str, note: str = "") -> str:
+        return summary_key(diff_text, self.provider, self.model, self.prompt_version, note)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        summary = self.cache.get(key)
+        if summary is not None:
+            print(f"Using cached {self.provider} summary for diff {key[:10]}")
+        return summary
+
+    def summarize_diff(self, diff_text: str, note: str = "") -> Optional[str]:
+        if not diff_text.strip():
+            return None
+        key = self._key(diff_text, note)
+        summary = self._lookup(key)
+        if summary is not None:
+            return summary
+        summary = self.inner.summarize_diff(diff_text, note)
+        if summary:
+            self.cache.put(key, self.provider, self.model, summary)
+        return summary
+
+    def summarize_diffs(self, requests: List[DiffRequest]) -> List[Optional[str]]:
+        keys = [self._key(r.diff_text, r.note) for r in requests]
+        found: Dict[str, Optional[str]] = {}
+        misses: Dict[str, int] = {}
+        for i, (request, key) in enumerate(zip(requests, keys)):
+            if not request.diff_text.strip() or key in found or key in misses:
+                continue
+            summary = self._lookup(key)
+            if summary is None:
+                misses[key] = i
+            else:
+                found[key] = summary
+
+        if misses:
+            fresh = self.inner.summarize_diffs([requests[i] for i in misses.values()])
+            for key, summary in zip(misses, fresh):
+                found[key] = summary
+                if summary:
+                    self.cache.put(key, self.provider, self.model, summary)
+        return [found.get(key) if r.diff_text.strip() else None for r, key in zip(requests, keys)]
@@ -1,71 +1,218 @@
 from __future__ import annotations
 
-from typing import Optional
-
-import requests
-
-from models import SnippetConfig
-
-
-def _trim(s: str, max_len: int) -> str:
+import html
+import threading
+from typing import Any, Dict, List, Optional
+
+from dispatcher import DeliveryResult, NotificationDispatcher, result_from_response
+from models import ChangeNotice, SnippetConfig
+from outbox import Outbox
+from ratelimit import TokenBucket
+from tracing import span
+from transport import HttpTransport, default_transport
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+# Bot API limits: about one message per second in a chat, 20 per minute in a
+# group, and 30 per second across all chats.
+CHAT_RATE = 1.0
+GROUP_RATE = 20 / 60
+GLOBAL_RATE = 30.0
+
+# Telegram max message is 4096 chars. Keep a buffer for safety.
+MAX_MESSAGE = 3800
+
+# Every part of a message is bounded, so a long URL or note can never push the
+# markup past MAX_MESSAGE and the finished HTML is never cut.
+NAME_CHARS = 160
+URL_CHARS = 300
+LABEL_CHARS = 64
+NOTE_CHARS = 300
+SUMMARY_CHARS = 1200
+DIFF_CHARS = 1800
+
+# Digest sections are kept shorter so several fit in one message.
+DIGEST_SUMMARY_CHARS = 400
+DIGEST_NOTE_CHARS = 200
+DIGEST_DIFF_CHARS = 1200
+DIGEST_HEADER_ROOM = 64
+
+
+def _escaped(s: str, max_len: int) -> str:
+    # Messages go out with parse_mode=HTML, so code and notes are escaped; the
+    # limit applies to the escaped text and never cuts an entity in half.
     s = (s or "").strip()
-    if len(s) <= max_len:
-        return s
-    return s[: max_len - 1] + "…"
+    text = html.escape(s, quote=False)
+    if len(text) <= max_len:
+        return text
+    kept: List[str] = []
+    size = 0
+    for char in s:
+        piece = html.escape(char, quote=False)
+        if size + len(piece) > max_len - 1:
+            break
+        kept.append(piece)
+        size += len(piece)
+    return "".join(kept) + "…"
 
 
 class TelegramNotifier:
+    channel = "telegram"
 
-    def __init__(self, bot_token: str, chat_id: str | int):
+    def __init__(
+        self,
+        bot_token: str,
+        chat_id: str | int,
+        transport: Optional[HttpTransport] = None,
+        outbox: Optional[Outbox] = None,
+        api_base: Optional[str] = None,
+    ):
         self.bot_token = (bot_token or "").strip()
         self.chat_id = str(chat_id).strip() if chat_id is not None else ""
-
-    def notify_change(
+        self.api_base = (api_base or TELEGRAM_API_BASE).rstrip("/")
+        self.transport = transport or default_transport()
+        self._global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.dispatcher = NotificationDispatcher(self, outbox) if outbox is not None else None
+
+    def render_message(
         self,
         snippet: SnippetConfig,
         diff_text: str,
         diff_summary: Optional[str] = None,
         diff_source: Optional[str] = None,
-    ) -> None:
-        if not self.bot_token or not self.chat_id:
-            print("Telegram credentials missing; skipping Telegram notification.")
-            return
-
-        # Telegram max message is 4096 chars. Keep a buffer for safety.
-        max_message = 3800
-
-        title = f"Code change detected in {snippet.owner}/{snippet.repo}"
+    ) -> str:
+        title = f"Code change detected in {_escaped(f'{snippet.owner}/{snippet.repo}', NAME_CHARS)}"
         meta = (
-            f"<b>File:</b> {snippet.file_url}\n"
+            f"<b>File:</b> {_escaped(snippet.file_url, URL_CHARS)}\n"
             f"<b>Lines monitored:</b> L{snippet.start_line}-L{snippet.end_line}\n"
-            f"<b>Note:</b> {snippet.note or '—'}"
+            f"<b>Note:</b> {_escaped(snippet.note or '—', NOTE_CHARS)}"
         )
 
         parts: list[str] = [f"<b>{title}</b>", meta]
 
         if diff_summary:
-            label = f"Diff summary ({diff_source})" if diff_source else "Diff summary"
-            parts.append(f"<b>{label}:</b>\n{_trim(diff_summary, 1200)}")
-
-        code_block = diff_text or "No diff text available"
-        code_block = _trim(code_block, 1800)
-        parts.append(f"<b>Code change diff:</b>\n<pre><code>{code_block}</code></pre>")
+            source = f" ({_escaped(diff_source, LABEL_CHARS)})" if diff_source else ""
+            parts.append(f"<b>Diff summary{source}:</b>\n{_escaped(diff_summary, SUMMARY_CHARS)}")
+
+        # The diff takes whatever room the other parts leave.
+        diff_part = "<b>Code change diff:</b>\n<pre><code>{}</code></pre>"
+        room = MAX_MESSAGE - len("\n\n".join([*parts, diff_part.format("")]))
+        code_block = _escaped(diff_text or "No diff text available", min(DIFF_CHARS, room))
+        parts.append(diff_part.format(code_block))
+
+        return "\n\n".join(parts)
+
+    def render_digest_section(self, notice: ChangeNotice) -> str:
+        snippet = notice.snippet
+        parts = [
+            f"<b>{_escaped(f'{snippet.owner}/{snippet.repo}', NAME_CHARS)}</b> · "
+            f"{_escaped(snippet.file_url, URL_CHARS)}\n"
+            f"<b>Lines:</b> L{snippet.start_line}-L{snippet.end_line} · "
+            f"<b>Note:</b> {_escaped(snippet.note or '—', DIGEST_NOTE_CHARS)}"
+        ]
+        if notice.diff_summary:
+            source = f" ({_escaped(notice.diff_source, LABEL_CHARS)})" if notice.diff_source else ""
+            parts.append(f"<b>Summary{source}:</b> {_escaped(notice.diff_summary, DIGEST_SUMMARY_CHARS)}")
+        code_block = _escaped(notice.diff_text or "No diff text available", DIGEST_DIFF_CHARS)
+        parts.append(f"<pre><code>{code_block}</code></pre>")
+        return "\n".join(parts)
+
+    def render_digest(self, notices: List[ChangeNotice]) -> List[str]:
+        # Sections are never split, so the HTML of each one stays balanced.
+        messages: List[List[str]] = []
+        current: List[str] = []
+        size = DIGEST_HEADER_ROOM
+        for notice in notices:
+            section = self.render_digest_section(notice)
+            if current and size + len(section) + 2 > MAX_MESSAGE:
+                messages.append(current)
+                current, size = [], DIGEST_HEADER_ROOM
+            current.append(section)
+            size += len(section) + 2
+        if current:
+            messages.append(current)
+
+        rendered = []
+        for part, sections in enumerate(messages, start=1):
+            header = f"<b>{len(notices)} code change{'s' if len(notices) != 1 else ''} detected</b>"
+            if len(messages) > 1:
+                header += f" ({part}/{len(messages)})"
+            rendered.append("\n\n".join([header, *sections]))
+        return rendered
 
-        message = "\n\n".join(parts)
-        message = _trim(message, max_message)
+    def notify_change(
+        self,
+        snippet: SnippetConfig,
+        diff_text: str,
+        diff_summary: Optional[str] = None,
+        diff_source: Optional[str] = None,
+    ) -> bool:
+        if not self.bot_token or not self.chat_id:
+            print("Telegram credentials missing; skipping Telegram notification.")
+            return False
 
-        url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
-        payload = {
-            "chat_id": self.chat_id,
-            "text": message,
-            "parse_mode": "HTML",
-            "disable_web_page_preview": True,
-        }
+        return self._deliver([self.render_message(snippet, diff_text, diff_summary, diff_source)])
 
+    def notify_digest(self, notices: List[ChangeNotice]) -> bool:
+        if not self.bot_token or not self.chat_id:
+            print("Telegram credentials missing; skipping Telegram notification.")
+            return False
+        return self._deliver(self.render_digest(notices))
+
+    def _deliver(self, messages: List[str]) -> bool:
+        payloads = [
+            {
+                "chat_id": self.chat_id,
+                "text": message,
+                "parse_mode": "HTML",
+                "disable_web_page_preview": True,
+            }
+            for message in messages
+        ]
+        if self.dispatcher is not None:
+            for payload in payloads:
+                self.dispatcher.enqueue(self.chat_id, payload)
+            return True
+        return all([self.send(self.chat_id, [payload]).ok for payload in payloads])
+
+    def pack(self, payloads: List[Dict[str, Any]]) -> int:
+        return 1
+
+    def throttle(self, target: str) -> float:
+        with self._lock:
+            bucket = self._chat_buckets.get(target)
+            if bucket is None:
+                rate = GROUP_RATE if target.startswith("-") else CHAT_RATE
+                bucket = self._chat_buckets[target] = TokenBucket(rate, 1)
+        wait = max(bucket.wait_time(), self._global_bucket.wait_time())
+        if wait == 0:
+            bucket.take()
+            self._global_bucket.take()
+        return wait
+
+    def send(self, target: str, payloads: List[Dict[str, Any]]) -> DeliveryResult:
+        url = f"{self.api_base}/bot{self.bot_token}/sendMessage"
         try:
-            resp = requests.post(url, json=payload, timeout=10)
-            if resp.status_code >= 400:
-                print(f"Failed to send Telegram notification: {resp.status_code} {resp.text}")
+            with span("telegram.send", chars=len(payloads[0]["text"])) as attrs:
+                resp = self.transport.post(url, json=payloads[0])
+                attrs["status"] = resp.status_code
         except Exception as e:
             print(f"Error sending Telegram notification: {e}")
-
+            return DeliveryResult(ok=False, error=str(e))
+
+        retry_after = None
+        if resp.status_code == 429:
+            try:
+                retry_after = float(resp.json()["parameters"]["retry_after"])
+            except Exception:
+                retry_after = None
+        result = result_from_response(resp, retry_after)
+        if not result.ok:
+            print(f"Failed to send Telegram notification: {resp.status_code} {resp.text}")
+        return result
+
+    def close(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.close()
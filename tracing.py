@@ -0,0 +1,126 @@
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_FORMATS = ("jsonl", "chrome")
+
+
+class Tracer:
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started = time.time()
+        self.root_id: Optional[int] = None
+        self._origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._spans.append(record)
+
+    def spans(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self._spans, key=lambda s: s["start"])
+
+    def write(self, directory: str, fmt: str = "jsonl") -> str:
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        extension = "json" if fmt == "chrome" else "jsonl"
+        path = os.path.join(directory, f"{self.name}-{stamp}-{self.trace_id}.{extension}")
+        with open(path, "w", encoding="utf-8") as f:
+            if fmt == "chrome":
+                json.dump(self._chrome_trace(), f)
+            else:
+                for record in self.spans():
+                    f.write(json.dumps({"trace": self.trace_id, **record}, default=str) + "\n")
+        return path
+
+    def _chrome_trace(self) -> Dict[str, Any]:
+        # Complete ("X") events on per-thread tracks; load in chrome://tracing or Perfetto.
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = []
+        threads: Dict[int, str] = {}
+        for record in self.spans():
+            threads[record["thread_id"]] = record["thread"]
+            events.append(
+                {
+                    "name": record["name"],
+                    "cat": "echelon",
+                    "ph": "X",
+                    "ts": round((record["start"] - self.started) * 1e6, 1),
+                    "dur": round(record["duration"] * 1e6, 1),
+                    "pid": pid,
+                    "tid": record["thread_id"],
+                    "args": {**record["attrs"], **({"error": record["error"]} if "error" in record else {})},
+                }
+            )
+        for tid, name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace": self.trace_id}}
+
+
+_active: Optional[Tracer] = None
+_local = threading.local()
+
+
+def start_trace(name: str = "cycle") -> Tracer:
+    global _active
+    _active = Tracer(name)
+    return _active
+
+
+def stop_trace(tracer: Tracer) -> None:
+    global _active
+    if _active is tracer:
+        _active = None
+
+
+@contextmanager
+def _record(tracer: Tracer, name: str, attrs: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    stack: List[int] = getattr(_local, "stack", None) or []
+    _local.stack = stack
+    span_id = next(tracer._ids)
+    if tracer.root_id is None:
+        tracer.root_id = span_id
+    # Work handed to another thread has no local parent; it hangs off the cycle.
+    parent = stack[-1] if stack else (tracer.root_id if tracer.root_id != span_id else None)
+    stack.append(span_id)
+    error: Optional[str] = None
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        stack.pop()
+        thread = threading.current_thread()
+        record = {
+            "span": span_id,
+            "parent": parent,
+            "name": name,
+            "start": tracer.started + (started - tracer._origin),
+            "duration": duration,
+            "thread": thread.name,
+            "thread_id": thread.ident,
+            "attrs": attrs,
+        }
+        if error is not None:
+            record["error"] = error
+        tracer._add(record)
+
+
+def span(name: str, **attrs: Any):
+    # Attributes can still be added through the yielded dict, e.g. a response status.
+    tracer = _active
+    if tracer is None:
+        return nullcontext(attrs)
+    return _record(tracer, name, attrs)
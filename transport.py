@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import HTTP_REQUESTS, HTTP_SECONDS
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class HttpTransport:
+    def __init__(
+        self,
+        pool_size: int = 10,
+        retries: int = 2,
+        backoff_factor: float = 0.5,
+        timeout: float = 10,
+        host_pool_sizes: Optional[Dict[str, int]] = None,
+    ):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+
+        default_adapter = self._build_adapter(pool_size)
+        self.session.mount("https://", default_adapter)
+        self.session.mount("http://", default_adapter)
+        for host, size in (host_pool_sizes or {}).items():
+            adapter = self._build_adapter(size)
+            self.session.mount(f"https://{host}/", adapter)
+            self.session.mount(f"http://{host}/", adapter)
+
+    def _build_adapter(self, pool_size: int) -> HTTPAdapter:
+        # Only idempotent methods are retried; webhook and LLM POSTs are not.
+        retry = Retry(
+            total=self._retries,
+            backoff_factor=self._backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        return HTTPAdapter(pool_connections=max(1, pool_size), pool_maxsize=max(1, pool_size), max_retries=retry)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self._send(self.session.get, url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self._send(self.session.post, url, **kwargs)
+
+    def _send(self, method, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).netloc
+        started = time.perf_counter()
+        try:
+            resp = method(url, **kwargs)
+        except Exception:
+            HTTP_REQUESTS.inc(host=host, status="error")
+            raise
+        finally:
+            HTTP_SECONDS.observe(time.perf_counter() - started, host=host)
+        HTTP_REQUESTS.inc(host=host, status=resp.status_code)
+        return resp
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_lock = threading.Lock()
+
+
+def default_transport() -> HttpTransport:
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport